@@ -11,111 +11,79 @@ COMPACT_THRESHOLD = 20
 HEAD_TAIL_COUNT = 9
 # ---------------
 
-
-def list_dir(path, prefix="", f=None):
-    """Full non-compact listing"""
-    entries = []
-    with os.scandir(path) as it:
-        for entry in sorted(it, key=lambda e: e.name.lower()):
-            if entry.name.startswith(".") and entry.name != ".env":
-                continue
-            entries.append(entry)
-
-    last_index = len(entries) - 1
-    for i, entry in enumerate(entries):
-        connector = "└── " if i == last_index else "├── "
-        line_prefix = prefix + connector
-
-        if entry.is_dir():
-            f.write(f"{line_prefix}{entry.name}/\n")
-            new_prefix = prefix + ("    " if i == last_index else "│   ")
-            list_dir(entry.path, new_prefix, f)
-        else:
-            f.write(f"{line_prefix}{entry.name}\n")
-
-
-def list_dir_compact(path, prefix="", f=None):
-    """Compact listing mode for long directories"""
-    entries = []
-    with os.scandir(path) as it:
-        for entry in sorted(it, key=lambda e: e.name.lower()):
-            if entry.name.startswith(".") and entry.name != ".env":
-                continue
-            entries.append(entry)
-
-    files = [e for e in entries if e.is_file()]
-    dirs = [e for e in entries if e.is_dir()]
-
-    # Directories first
-    for i, d in enumerate(dirs):
-        is_last = (i == len(dirs) - 1) and not files
-        connector = "└── " if is_last else "├── "
-        f.write(f"{prefix}{connector}{d.name}/\n")
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        list_dir_compact(d.path, new_prefix, f)
-
-    # Then files
-    total_files = len(files)
-    if total_files == 0:
-        return
-
-    if total_files > COMPACT_THRESHOLD:
-        display = files[:HEAD_TAIL_COUNT] + files[-HEAD_TAIL_COUNT:]
-        hidden_count = total_files - (HEAD_TAIL_COUNT * 2)
-        for i, fe in enumerate(display):
-            connector = "└── " if i == len(display) - 1 and hidden_count <= 0 else "├── "
-            f.write(f"{prefix}{connector}{fe.name}\n")
-            if i == HEAD_TAIL_COUNT - 1:
-                f.write(f"{prefix}│   ... ({hidden_count} files hidden) ...\n")
-    else:
-        for i, fe in enumerate(files):
-            connector = "└── " if i == len(files) - 1 else "├── "
-            f.write(f"{prefix}{connector}{fe.name}\n")
-
-
-def get_directory_tree_string():
-    """Always return compact version as string (for README update)"""
-    from io import StringIO
-    buffer = StringIO()
-
-    def write_tree(path, prefix=""):
-        entries = []
+ROOT_LINE = f"{os.path.basename(os.path.abspath(ROOT_DIR))}/\n"
+LAST, MID, PAD_LAST, PAD_MID = "└── ", "├── ", "    ", "│   "
+
+
+def iter_tree(root, compact):
+    """Yield the listing lines under root (compact: dirs first, long file runs trimmed)"""
+    # Explicit stack instead of recursion: items are either ready lines (str)
+    # or (path, prefix) directories still to expand, pushed in reverse order
+    stack = [(root, "")]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+            continue
+        path, prefix = item
+
+        # Drop hidden entries before sorting, not after
         with os.scandir(path) as it:
-            for entry in sorted(it, key=lambda e: e.name.lower()):
-                if entry.name.startswith(".") and entry.name != ".env":
-                    continue
-                entries.append(entry)
-
-        files = [e for e in entries if e.is_file()]
-        dirs = [e for e in entries if e.is_dir()]
-
+            entries = [e for e in it if not (e.name.startswith(".") and e.name != ".env")]
+        entries.sort(key=lambda e: e.name.lower())
+
+        todo = []
+        if not compact:
+            last_index = len(entries) - 1
+            for i, entry in enumerate(entries):
+                connector = LAST if i == last_index else MID
+                line_prefix = prefix + connector
+
+                if entry.is_dir():
+                    todo.append("".join((line_prefix, entry.name, "/\n")))
+                    new_prefix = prefix + (PAD_LAST if i == last_index else PAD_MID)
+                    todo.append((entry.path, new_prefix))
+                else:
+                    todo.append("".join((line_prefix, entry.name, "\n")))
+            stack.extend(reversed(todo))
+            continue
+
+        # One pass, one is_dir() per entry; order stays sorted in both lists
+        dirs, files = [], []
+        for e in entries:
+            if e.is_dir():
+                dirs.append(e)
+            elif e.is_file():
+                files.append(e)
+
+        # Directories first
         for i, d in enumerate(dirs):
             is_last = (i == len(dirs) - 1) and not files
-            connector = "└── " if is_last else "├── "
-            buffer.write(f"{prefix}{connector}{d.name}/\n")
-            new_prefix = prefix + ("    " if is_last else "│   ")
-            write_tree(d.path, new_prefix)
+            connector = LAST if is_last else MID
+            todo.append("".join((prefix, connector, d.name, "/\n")))
+            new_prefix = prefix + (PAD_LAST if is_last else PAD_MID)
+            todo.append((d.path, new_prefix))
 
+        # Then files
         total_files = len(files)
-        if total_files == 0:
-            return
-
         if total_files > COMPACT_THRESHOLD:
             display = files[:HEAD_TAIL_COUNT] + files[-HEAD_TAIL_COUNT:]
             hidden_count = total_files - (HEAD_TAIL_COUNT * 2)
             for i, fe in enumerate(display):
-                connector = "└── " if i == len(display) - 1 and hidden_count <= 0 else "├── "
-                buffer.write(f"{prefix}{connector}{fe.name}\n")
+                connector = LAST if i == len(display) - 1 and hidden_count <= 0 else MID
+                todo.append("".join((prefix, connector, fe.name, "\n")))
                 if i == HEAD_TAIL_COUNT - 1:
-                    buffer.write(f"{prefix}│   ... ({hidden_count} files hidden) ...\n")
+                    todo.append(f"{prefix}{PAD_MID}... ({hidden_count} files hidden) ...\n")
         else:
             for i, fe in enumerate(files):
-                connector = "└── " if i == len(files) - 1 else "├── "
-                buffer.write(f"{prefix}{connector}{fe.name}\n")
+                connector = LAST if i == len(files) - 1 else MID
+                todo.append("".join((prefix, connector, fe.name, "\n")))
+        stack.extend(reversed(todo))
 
-    buffer.write(f"{os.path.basename(os.path.abspath(ROOT_DIR))}/\n")
-    write_tree(ROOT_DIR)
-    return buffer.getvalue()
+
+def get_directory_tree_string():
+    """Always return compact version as string (for README update)"""
+    return ROOT_LINE + "".join(iter_tree(ROOT_DIR, compact=True))
 
 
 def update_readme_with_tree(tree_string):
@@ -160,15 +128,15 @@ def update_readme_with_tree(tree_string):
 
 
 # --- MAIN EXECUTION ---
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write(f"{os.path.basename(os.path.abspath(ROOT_DIR))}/\n")
-    if COMPACT_MODE:
-        list_dir_compact(ROOT_DIR, f=f)
-    else:
-        list_dir(ROOT_DIR, f=f)
+with open(OUTPUT_FILE, "w", encoding="utf-8", buffering=1 << 20) as f:
+    # Walk only once the output file exists, so it lists itself as before;
+    # lines are collected first and written in one call
+    lines = [ROOT_LINE]
+    lines.extend(iter_tree(ROOT_DIR, COMPACT_MODE))
+    f.writelines(lines)
 
 print(f"✅ Directory structure saved to {OUTPUT_FILE} (compact mode: {COMPACT_MODE})")
 
-# Always update README with compact tree
-tree_string = get_directory_tree_string()
+# Always update README with compact tree (the .txt walk is reused when already compact)
+tree_string = "".join(lines) if COMPACT_MODE else get_directory_tree_string()
 update_readme_with_tree(tree_string)
\ No newline at end of file
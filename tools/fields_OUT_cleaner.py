@@ -1,54 +1,77 @@
 #!/usr/bin/env python3
 import os
-import json
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 
 # === CONFIG ===
 OUT_DIR = "./in_out-s/working_split_OUT--API-1"
 TARGET_KEYS = ("description", "preview")
+TARGET_KEYS_SET = frozenset(TARGET_KEYS)
+TARGET_KEYS_BYTES = tuple(f'"{key}"'.encode() for key in TARGET_KEYS)
 
-fixed_files = []
-checked_files = 0
 
-for filename in sorted(os.listdir(OUT_DIR)):
-    if not filename.startswith("out_") or not filename.endswith(".json"):
-        continue
-
-    file_path = os.path.join(OUT_DIR, filename)
-    checked_files += 1
+def clean_one(file_path):
+    """Rimuove TARGET_KEYS da un file out_; ritorna (nome, modificato, errore di lettura)"""
+    filename = os.path.basename(file_path)
     changed = False
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        # File già pulito: nessuna chiave target nel testo, niente parse
+        if not any(key in raw for key in TARGET_KEYS_BYTES):
+            return filename, False, None
+        data = orjson.loads(raw)
     except Exception as e:
-        print(f"⚠️  Error reading {filename}: {e}")
-        continue
+        return filename, False, str(e)
 
     if isinstance(data, dict) and "folders" in data:
         for folder in data.get("folders", []):
             bookmarks = folder.get("bookmarks", [])
             for bm in bookmarks:
                 if isinstance(bm, dict):
-                    for key in TARGET_KEYS:
-                        if key in bm:
+                    # Una sola intersezione per bookmark invece di un lookup per chiave
+                    hits = bm.keys() & TARGET_KEYS_SET
+                    if hits:
+                        for key in hits:
                             del bm[key]
-                            changed = True
+                        changed = True
 
         # Se sono state fatte modifiche, salva il file
         if changed:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            fixed_files.append(filename)
-
-# === REPORT ===
-print("\n=== CLEANUP REPORT ===")
-print(f"📂 Directory: {OUT_DIR}")
-print(f"🧩 Files checked: {checked_files}")
-print(f"✅ Files fixed: {len(fixed_files)}")
-
-if fixed_files:
-    print("\nModified files:")
-    for name in fixed_files:
-        print(f"  • {name}")
-
-print("\n✨ Done.\n")
\ No newline at end of file
+            with open(file_path, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+    return filename, changed, None
+
+
+if __name__ == "__main__":
+    with os.scandir(OUT_DIR) as it:
+        paths = [
+            e.path
+            for e in sorted(it, key=lambda e: e.name)
+            if e.name.startswith("out_") and e.name.endswith(".json")
+        ]
+    checked_files = len(paths)
+    fixed_files = []
+
+    # I file sono indipendenti: un processo per core, risultati nell'ordine di input
+    with ProcessPoolExecutor() as ex:
+        for filename, changed, error in ex.map(clean_one, paths, chunksize=16):
+            if error is not None:
+                print(f"⚠️  Error reading {filename}: {error}")
+            elif changed:
+                fixed_files.append(filename)
+
+    # === REPORT ===
+    print("\n=== CLEANUP REPORT ===")
+    print(f"📂 Directory: {OUT_DIR}")
+    print(f"🧩 Files checked: {checked_files}")
+    print(f"✅ Files fixed: {len(fixed_files)}")
+
+    if fixed_files:
+        print("\nModified files:")
+        for name in fixed_files:
+            print(f"  • {name}")
+
+    print("\n✨ Done.\n")
\ No newline at end of file
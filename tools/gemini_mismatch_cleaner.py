@@ -15,9 +15,12 @@ Gemini Outputs Cleaner v11 — Full Sync + URL/Title Alignment + Auto-Fix
 
 import os
 import re
-import json
+import orjson
 import shutil
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from functools import lru_cache
 from typing import Dict, Tuple
 
 # -----------------------------
@@ -27,6 +30,7 @@ INPUT_DIR = "./in_out-s/working_split_IN--1"
 OUTPUT_DIR = "./in_out-s/working_split_OUT--API-1"
 BACKUP_DIR = "./in_out-s/split_backup_cleaner"
 REPORT_PATH = "./in_out-s/gemini_clean_report.json"
+CACHE_PATH = "./in_out-s/.gemini_clean_cache.json"  # pairs già verificati senza differenze
 
 os.makedirs(BACKUP_DIR, exist_ok=True)
 ID_RE = re.compile(r"(?:^|_)split_(\d{4})\.json$", re.IGNORECASE)
@@ -36,15 +40,32 @@ ID_RE = re.compile(r"(?:^|_)split_(\d{4})\.json$", re.IGNORECASE)
 # URL normalization
 # -----------------------------
 def normalize_url(url: str) -> str:
-    if not isinstance(url, str) or not url.strip():
+    if not isinstance(url, str):
         return ""
+    return _normalize_str(url)
+
+
+@lru_cache(maxsize=200_000)
+def _normalize_str(url: str) -> str:
+    # Memoized: the same URL is normalized several times per pair and recurs across splits
     u = url.strip()
-    u = re.sub(r"^https?://", "", u, flags=re.IGNORECASE)
-    u = re.sub(r"^www\.", "", u, flags=re.IGNORECASE)
-    u = u.split("?", 1)[0].split("#", 1)[0]
+    if not u:
+        return ""
+    # lowercase first: the anchored prefixes become plain startswith/slice
+    u = u.lower()
+    if u.startswith("https://"):
+        u = u[8:]
+    elif u.startswith("http://"):
+        u = u[7:]
+    if u.startswith("www."):
+        u = u[4:]
+    for sep in "?#":
+        cut = u.find(sep)
+        if cut != -1:
+            u = u[:cut]
     if u.endswith("/"):
         u = u[:-1]
-    return u.lower()
+    return u
 
 
 # -----------------------------
@@ -71,6 +92,7 @@ def extract_output_index(data: dict) -> Dict[str, Tuple[dict, dict]]:
     """
     Crea indice URL normalizzato → (folder, bookmark) dall’output.
     Corregge bookmark non validi (string → {"url": ..., "title": ""}).
+    Ogni bookmark tenuto riceve "_norm", da rimuovere prima del salvataggio.
     """
     if not isinstance(data, dict):
         return {}
@@ -81,6 +103,7 @@ def extract_output_index(data: dict) -> Dict[str, Tuple[dict, dict]]:
 
     idx = {}
     fix_count = 0
+    normalize = normalize_url
 
     for folder in folders:
         if not isinstance(folder, dict):
@@ -91,6 +114,7 @@ def extract_output_index(data: dict) -> Dict[str, Tuple[dict, dict]]:
             continue
 
         new_bms = []
+        keep = new_bms.append
         for bm in bms:
             # --- correzione automatica ---
             if isinstance(bm, str):
@@ -103,10 +127,11 @@ def extract_output_index(data: dict) -> Dict[str, Tuple[dict, dict]]:
             if not isinstance(url, str) or not url.strip():
                 continue
 
-            n = normalize_url(url)
+            n = normalize(url)
             if n:
                 idx[n] = (folder, bm)
-            new_bms.append(bm)
+            bm["_norm"] = n
+            keep(bm)
 
         folder["bookmarks"] = new_bms
         folder["count"] = len(new_bms)
@@ -118,20 +143,23 @@ def extract_output_index(data: dict) -> Dict[str, Tuple[dict, dict]]:
 # -----------------------------
 # File pairing (in/out)
 # -----------------------------
+def list_json(dir_path: str) -> Dict[str, str]:
+    """Nome → path dei file .json in una directory (una sola lettura, nessuno stat)."""
+    with os.scandir(dir_path) as it:
+        return {e.name: e.path for e in it if e.name.endswith(".json")}
+
+
 def pair_files() -> Dict[str, Tuple[str, str]]:
+    out_files = list_json(OUTPUT_DIR)
     pairs = {}
-    for name in os.listdir(INPUT_DIR):
-        if not name.endswith(".json"):
-            continue
-        m = ID_RE.search(name.replace("in_", ""))
+    for name, in_path in list_json(INPUT_DIR).items():
+        m = ID_RE.search(name[3:] if name.startswith("in_") else name)
         if not m:
             continue
         sid = m.group(1)
-        in_path = os.path.join(INPUT_DIR, name)
-        for cand in [f"out_split_{sid}.json", f"split_{sid}.json"]:
-            out_path = os.path.join(OUTPUT_DIR, cand)
-            if os.path.exists(out_path):
-                pairs[sid] = (in_path, out_path)
+        for cand in (f"out_split_{sid}.json", f"split_{sid}.json"):
+            if cand in out_files:
+                pairs[sid] = (in_path, out_files[cand])
                 break
     return pairs
 
@@ -148,28 +176,54 @@ def ensure_backup(src_path: str, prefix: str):
         shutil.copy2(src_path, dst)
 
 
+# -----------------------------
+# Clean-pair cache
+# -----------------------------
+def file_key(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_cache() -> dict:
+    """sid → [in_key, out_key] of pairs found clean on a previous run."""
+    try:
+        with open(CACHE_PATH, "rb") as f:
+            cache = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_cache(cache: dict):
+    with open(CACHE_PATH, "wb") as f:
+        f.write(orjson.dumps(cache, option=orjson.OPT_SORT_KEYS))
+
+
 # -----------------------------
 # Core processing
 # -----------------------------
-def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bool, report: dict):
+def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bool) -> Tuple[bool, dict]:
+    """
+    Sincronizza una coppia input/output. Ritorna (changed, report_entry):
+    changed è None se i JSON non sono leggibili, False se non ci sono differenze.
+    """
     try:
-        with open(in_path, "r", encoding="utf-8") as f:
-            in_json = json.load(f)
-        with open(out_path, "r", encoding="utf-8") as f:
-            out_json = json.load(f)
+        with open(in_path, "rb") as f:
+            in_json = orjson.loads(f.read())
+        with open(out_path, "rb") as f:
+            out_json = orjson.loads(f.read())
     except Exception as e:
         print(f"⚠️  split_{sid}: errore lettura JSON ({e})")
-        return False
+        return None, None
 
     input_map = extract_input_map(in_json)
     out_index = extract_output_index(out_json)
     auto_fixes = out_json.pop("_auto_fix_count", 0)
 
-    in_norms = set(input_map.keys())
-    out_norms = set(out_index.keys())
-
-    missing = sorted(in_norms - out_norms)
-    extra = sorted(out_norms - in_norms)
+    # Probe the other side's dict directly: no intermediate key sets, no sorting
+    # (only counts end up in the report)
+    missing = [n for n in input_map if n not in out_index]
+    extra = {n for n in out_index if n not in input_map}
 
     url_changes, title_changes = [], []
 
@@ -184,9 +238,10 @@ def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bo
     # Clean input
     # --------------------------
     if apply and missing:
+        missing_set = set(missing)
         in_json["data"] = [
             it for it in in_json.get("data", [])
-            if normalize_url(it.get("url")) not in set(missing)
+            if normalize_url(it.get("url")) not in missing_set
         ]
     if "_meta" not in in_json:
         in_json["_meta"] = {}
@@ -196,23 +251,32 @@ def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bo
     # Clean + Sync output
     # --------------------------
     new_folders = []
+    total_bookmarks = 0
+    # Lookup locali: il loop gira una volta per bookmark
+    input_map_get = input_map.get
+    normalize = normalize_url
     for folder in out_json.get("folders", []):
         new_bms = []
+        keep = new_bms.append
         for bm in folder.get("bookmarks", []):
             if not isinstance(bm, dict):
                 continue
 
-            cur_url = bm.get("url", "")
-            n = normalize_url(cur_url)
+            url = bm.get("url")
+            # URL già normalizzato da extract_output_index (pop: non finisce nel JSON)
+            n = bm.pop("_norm", None)
+            if n is None:
+                n = normalize(url)
             if not n or n in extra:
                 continue
 
-            if n in input_map:
-                correct_url, correct_title = input_map[n]
+            synced = input_map_get(n)
+            if synced is not None:
+                correct_url, correct_title = synced
 
                 # --- URL sync ---
-                if bm.get("url") != correct_url:
-                    url_changes.append({"from": bm["url"], "to": correct_url})
+                if url != correct_url:
+                    url_changes.append({"from": url, "to": correct_url})
                     if apply:
                         bm["url"] = correct_url
                     if verbose:
@@ -227,38 +291,39 @@ def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bo
                     if verbose:
                         print(f"📝 [split_{sid}] TITLE: {cur_title} → {correct_title}")
 
-            new_bms.append(bm)
+            keep(bm)
 
         if new_bms:
+            count = len(new_bms)
             folder["bookmarks"] = new_bms
-            folder["count"] = len(new_bms)
+            folder["count"] = count
             new_folders.append(folder)
+            total_bookmarks += count
 
-    # --- Aggiornamento conteggi ---
+    # --- Aggiornamento conteggi (totale accumulato nel loop) ---
     out_json["folders"] = new_folders
     out_json["num_folders"] = len(new_folders)
-    out_json["total_bookmarks"] = sum(f.get("count", 0) for f in new_folders)
+    out_json["total_bookmarks"] = total_bookmarks
 
     # --------------------------
     # Skip if no diffs
     # --------------------------
-    has_diffs = any([missing, extra, url_changes, title_changes, auto_fixes])
-    if not has_diffs:
-        return False
+    if not (missing or extra or url_changes or title_changes or auto_fixes):
+        return False, None
 
     # --------------------------
     # Save if applied
     # --------------------------
     if apply:
-        with open(in_path, "w", encoding="utf-8") as f:
-            json.dump(in_json, f, ensure_ascii=False, indent=2)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(out_json, f, ensure_ascii=False, indent=2)
+        with open(in_path, "wb", buffering=1 << 20) as f:
+            f.write(orjson.dumps(in_json, option=orjson.OPT_INDENT_2))
+        with open(out_path, "wb", buffering=1 << 20) as f:
+            f.write(orjson.dumps(out_json, option=orjson.OPT_INDENT_2))
 
     # --------------------------
     # Report entry
     # --------------------------
-    report[sid] = {
+    entry = {
         "file_input": os.path.basename(in_path),
         "file_output": os.path.basename(out_path),
         "missing_count": len(missing),
@@ -284,7 +349,7 @@ def process_pair(sid: str, in_path: str, out_path: str, apply: bool, verbose: bo
               f"missing={len(missing)}, extra={len(extra)}, auto_fixed={auto_fixes} "
               f"(es: {example})")
 
-    return True
+    return True, entry
 
 
 # -----------------------------
@@ -294,6 +359,7 @@ def main():
     parser = argparse.ArgumentParser(description="Gemini input/output sync with visible URL/title diffs.")
     parser.add_argument("--apply", action="store_true", help="Applica le modifiche (default = anteprima).")
     parser.add_argument("--verbose", action="store_true", help="Mostra tutti i cambiamenti URL/titolo in console.")
+    parser.add_argument("--rescan", action="store_true", help="Ignora la cache e ricontrolla tutte le coppie.")
     args = parser.parse_args()
 
     pairs = pair_files()
@@ -302,17 +368,38 @@ def main():
         print("❌ Nessuna coppia input/output trovata.")
         return
 
+    # Pairs whose files are unchanged (mtime + size) since they were last found clean are skipped
+    cache = {} if args.rescan else load_cache()
     report = {}
     diff_count = 0
+    skipped = 0
+    todo = []
     for sid, (in_path, out_path) in sorted(pairs.items()):
-        changed = process_pair(sid, in_path, out_path, apply=args.apply, verbose=args.verbose, report=report)
-        if changed:
-            diff_count += 1
+        keys = [file_key(in_path), file_key(out_path)]
+        if cache.get(sid) == keys:
+            skipped += 1
+            continue
+        todo.append((sid, in_path, out_path, keys))
+
+    # Each pair touches only its own two files: CPU-bound work spread over all cores
+    sids, in_paths, out_paths, file_keys = zip(*todo) if todo else ((),) * 4
+    with ProcessPoolExecutor() as ex:
+        results = ex.map(process_pair, sids, in_paths, out_paths,
+                         repeat(args.apply), repeat(args.verbose), chunksize=8)
+        for sid, keys, (changed, entry) in zip(sids, file_keys, results):
+            if changed:
+                diff_count += 1
+                report[sid] = entry
+            if changed is False:
+                cache[sid] = keys
+            else:
+                cache.pop(sid, None)  # diffs, or files rewritten by --apply: re-check next run
+    save_cache(cache)
 
     # Save report only if not empty
     if report:
-        with open(REPORT_PATH, "w", encoding="utf-8") as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(REPORT_PATH, "wb", buffering=1 << 20) as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
 
     print("\n--- FULL SYNC SUMMARY ---")
     if diff_count:
@@ -321,6 +408,8 @@ def main():
         print(f"📄 Report: {REPORT_PATH}")
     else:
         print(f"✅ Nessuna differenza trovata su {total_files} file.")
+    if skipped:
+        print(f"⏭️  Coppie invariate saltate (cache): {skipped}")
     print(f"📂 Backups: {BACKUP_DIR}")
 
 
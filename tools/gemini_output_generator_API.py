@@ -2,17 +2,18 @@
 """
 Gemini 2.5 Parallel Batch Processor (Flash + Pro)
 - One worker per (API key × model)
-- Per-key throttling, flash boost when pro exhausted
+- Per-key throttling
 - Compact Rich TUI with spinner, horizontal stats, and no flicker
 """
 
 # =========================
 # Imports & Global Silencing
 # =========================
-import os, re, json, time, signal, threading, logging, warnings
-from dataclasses import dataclass
+import os, re, time, signal, threading, logging, warnings
+import orjson
+from dataclasses import dataclass, field
+from typing import Optional
 from queue import Queue, Empty
-from itertools import cycle
 from datetime import datetime
 
 # Suppress all unnecessary backend noise
@@ -31,14 +32,14 @@ try:
 except Exception:
     pass
 
-for lib in ("grpc", "absl", "google.generativeai"):
+for lib in ("grpc", "absl", "google_genai", "httpx"):
     logging.getLogger(lib).setLevel(logging.CRITICAL)
 
 # =========================
 # Dependencies
 # =========================
 from dotenv import load_dotenv
-import google.generativeai as genai
+from google import genai
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
@@ -77,116 +78,153 @@ class Job:
     in_path: str
     out_path: str
     filename: str
+    payload: Optional[str] = None  # input JSON text, read on first pickup and kept across re-queues
 
 @dataclass(frozen=True)
 class WorkerId:
     key_idx: int
     model_type: str  # "flash" or "pro"
 
+@dataclass
+class WorkerState:
+    """Status slot of one worker: written only by its own thread, read lock-free by the UI."""
+    file: Optional[str] = None
+    state: str = "idle"
+    done: int = 0
+
+    def set(self, file, state, done=False):
+        self.file, self.state = file, state
+        if done:
+            self.done += 1
+            done_total.add(1)
+
+@dataclass
+class AtomicCounter:
+    """Shared int updated under its own lock; the UI reads `value` as a plain load."""
+    value: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, n):
+        with self.lock:
+            self.value += n
+
+@dataclass
+class TokenBucket:
+    """Per-(key, model) limiter: refills `rate` tokens/s up to 1; each call takes one."""
+    rate: float
+    tokens: float = 1.0
+    last_refill: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(1.0, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1.0  # reserve now; a negative balance is waited out below
+            wait = -self.tokens / self.rate
+        # Sleep outside any lock: other (key, model) pairs are never blocked
+        if wait > 0:
+            time.sleep(wait)
+
 # =========================
 # Globals
 # =========================
 console = Console()
 shutdown_event = threading.Event()
 
-last_call_ts, exhausted, worker_status, worker_done = {}, {}, {}, {}
-locks = dict(last_call=threading.Lock(), exhausted=threading.Lock(),
-             flash=threading.Lock(), status=threading.Lock())
-flash_boost_enabled = False
-exhausted_cycle = cycle([
-    "( ˘³˘)zz",
-    "( ˘³˘)zz",
+exhausted = {}
+worker_slots = {}  # WorkerId → WorkerState, built once in main()
+clients = {}  # key_idx → genai.Client, built once in main()
+buckets = {}  # (key_idx, model_type) → TokenBucket, built once in main()
+locks = dict(exhausted=threading.Lock())
+remaining_jobs = AtomicCounter()  # jobs not consumed yet (re-queued ones still count)
+done_total = AtomicCounter()  # sum of every WorkerState.done, kept for the dashboard
+write_queue = Queue()  # (out_file, parsed) → writer_loop; None stops it
+# Animation frames, each held FRAME_SECONDS (3 dashboard ticks of 0.2s)
+FRAME_SECONDS = 0.6
+EXHAUSTED_FRAMES = (
     "( ˘³˘)zz",
     "( ˘3˘)Zz",
-    "( ˘3˘)Zz",
-    "( ˘3˘)Zz",
     "( ˊ³ˋ)ZZ",
-    "( ˊ³ˋ)ZZ",
-    "( ˊ³ˋ)ZZ",
-    "( ˊ3ˋ)zZ",
     "( ˊ3ˋ)zZ",
-    "( ˊ3ˋ)zZ",
-    "( ˊ°ˋ)zz",
     "( ˊ°ˋ)zz",
-    "( ˊ°ˋ)zz",
-    "( ˊ¤ˋ)Zz",
-    "( ˊ¤ˋ)Zz",
     "( ˊ¤ˋ)Zz",
     "( ˊOˋ)ZZ",
-    "( ˊOˋ)ZZ",
-    "( ˊOˋ)ZZ",
     "( ˊ૦ˋ)zZ",
-    "( ˊ૦ˋ)zZ",
-    "( ˊ૦ˋ)zZ",
-    "( ˊ°ˋ)zz",
     "( ˊ°ˋ)zz",
-    "( ˊ°ˋ)zz",
-    "( ˊ³ˋ)Zz",
-    "( ˊ³ˋ)Zz",
     "( ˊ³ˋ)Zz",
-])
+)
 
 
-working_cycle = cycle([
+WORKING_FRAMES = (
     "ᓚ( `□´)ງ",
-    "ᓚ( `□´)ງ",
-    "ᓚ( `□´)ງ",
-    "ᕦ(✧˙ж˙)ງ",
     "ᕦ(✧˙ж˙)ງ",
-    "ᕦ(✧˙ж˙)ງ",
-    "ᕦ(⊹°■°)ᕤ",
     "ᕦ(⊹°■°)ᕤ",
-    "ᕦ(⊹°■°)ᕤ",
-    "ᕦ(˚`▽´)ᕤ",
-    "ᕦ(˚`▽´)ᕤ",
     "ᕦ(˚`▽´)ᕤ",
     "ᓚ(˚ˊ▽ˋ)ᕤ",
-    "ᓚ(˚ˊ▽ˋ)ᕤ",
-    "ᓚ(˚ˊ▽ˋ)ᕤ",
     "ᓚ( ˊ□ˋ)ງ",
-    "ᓚ( ˊ□ˋ)ງ",
-    "ᓚ( ˊ□ˋ)ງ",
-])
+)
 
 with open(RULES_FILE, "r", encoding="utf-8") as f:
     AI_RULES = f.read().strip()
 
+# Constant part of every prompt, built once; only the JSON payload varies per file
+PROMPT_PREFIX = f"""{AI_RULES}
+
+Now categorize the following data according to the above rules.
+Additional constraints:
+- Split folders >20 links into coherent subgroups.
+- Keep balanced grouping.
+- CRITICAL: Only include `url` and `title` fields.
+- CRITICAL: Avoid folders with only 1 or 2 links.
+
+Return only valid JSON.
+
+"""
+
+# Opening ```json fence of the model answer; the closing ``` is checked with endswith
+FENCE_HEAD_RE = re.compile(r"```[a-zA-Z0-9]*\n?")
+FENCE_TAIL = "```"
+# Input split directories under BASE_DIR
+IN_DIR_RE = re.compile(r"working_split_IN--\d+")
+# 4-digit sequence number in split file names (in_0001.json → 1)
+SEQ_RE = re.compile(r"(\d{4})")
+
 # =========================
 # Utility
 # =========================
 def rate_sleep(worker):
-    with locks["last_call"]:
-        now = time.time()
-        key = (worker.key_idx, worker.model_type)
-        with locks["flash"]:
-            rpm = REQUESTS_PER_MIN_BASE[worker.model_type]
-        min_gap = 60.0 / max(1, rpm)
-        diff = now - last_call_ts.get(key, 0.0)
-        if diff < min_gap:
-            time.sleep(min_gap - diff)
-        last_call_ts[key] = time.time()
-
-def get_model(worker):
-    """Return a thread-local GenerativeModel configured with its own API key."""
-    api_key = API_KEYS[worker.key_idx]
-    # configure() is idempotent but not thread-safe globally — we reconfigure per thread
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel(MODELS[worker.model_type])
+    buckets[(worker.key_idx, worker.model_type)].acquire()
+
+def clean_response_text(text):
+    """Strip surrounding whitespace and an optional markdown code fence."""
+    text = text.strip()
+    # The regex only matches the head: the body is never scanned
+    m = FENCE_HEAD_RE.match(text)
+    if m:
+        text = text[m.end():]
+    # The closing fence is stripped on its own, with or without an opening one;
+    # like the original inline code, the text is only re-stripped in that case
+    if text.endswith(FENCE_TAIL):
+        text = text[:-len(FENCE_TAIL)].strip()
+    return text
+
+def get_client(worker):
+    """Return the persistent Client bound to this worker's API key (no global configure)."""
+    return clients[worker.key_idx]
 
 def mark_exhausted(worker):
-    global flash_boost_enabled
     with locks["exhausted"]:
         exhausted[(worker.key_idx, worker.model_type)] = True
-        all_pro_exhausted = all(exhausted.get((i,"pro"), False) for i in range(len(API_KEYS)))
-    with locks["flash"]:
-        flash_boost_enabled = all_pro_exhausted
 
 def is_exhausted(worker):
     with locks["exhausted"]:
         return exhausted.get((worker.key_idx, worker.model_type), False)
 
 def detect_io_pair(base_dir=BASE_DIR):
-    in_dirs = sorted([d for d in os.listdir(base_dir) if re.match(r"^working_split_IN--\d+$", d)])
+    with os.scandir(base_dir) as it:
+        in_dirs = sorted(e.name for e in it if IN_DIR_RE.fullmatch(e.name) and e.is_dir())
     if not in_dirs:
         raise RuntimeError("No input directories found.")
     for in_dir in in_dirs:
@@ -195,20 +233,28 @@ def detect_io_pair(base_dir=BASE_DIR):
         in_path = os.path.join(base_dir, in_dir)
         out_path = os.path.join(base_dir, out_dir)
         os.makedirs(out_path, exist_ok=True)
-        in_files = sorted([f for f in os.listdir(in_path) if f.startswith("in_") and f.endswith(".json")])
-        out_files = {f for f in os.listdir(out_path) if f.startswith("out_") and f.endswith(".json")}
-        remaining = [f for f in in_files if f.replace("in_", "out_", 1) not in out_files]
+        with os.scandir(out_path) as it:
+            out_files = {e.name for e in it if e.name.startswith("out_") and e.name.endswith(".json")}
+        # One pass over the input listing; no pre-sort, build_queue orders the jobs.
+        # Names all start with "in_": slicing the fixed prefix beats str.replace
+        with os.scandir(in_path) as it:
+            remaining = [
+                e.name for e in it
+                if e.name.startswith("in_") and e.name.endswith(".json")
+                and "out_" + e.name[3:] not in out_files
+            ]
         if remaining:
             return in_path, out_path, remaining
     raise RuntimeError("All directories fully processed.")
 
 def build_queue(in_path, out_path, remaining):
-    def sort_key(name):
-        m = re.search(r"(\d{4})", name)
-        return int(m.group(1)) if m else 10**9
+    # (seq, name) pairs built once; names without a number go last
+    keyed = [(int(m.group(1)) if (m := SEQ_RE.search(f)) else 10**9, f) for f in remaining]
+    keyed.sort()
     q = Queue()
-    for f in sorted(remaining, key=sort_key):
+    for _, f in keyed:
         q.put(Job(in_path, out_path, f))
+    remaining_jobs.add(len(keyed))
     return q
 
 # =========================
@@ -216,29 +262,22 @@ def build_queue(in_path, out_path, remaining):
 # =========================
 def process_one(job, worker):
     in_file = os.path.join(job.in_path, job.filename)
-    out_filename = job.filename.replace("in_", "out_", 1)
+    out_filename = "out_" + job.filename[3:]
     out_file = os.path.join(job.out_path, out_filename)
 
     # console.log(f"[DEBUG] Worker {worker} starting to process {job.filename}")
 
-    with open(in_file, "r", encoding="utf-8") as f:
-        content = json.load(f)
+    # The split file is already JSON: send its text as-is instead of
+    # parsing and re-serializing it for every call. It is read once per job:
+    # a job re-queued after a quota hit keeps it for the next worker.
+    if job.payload is None:
+        with open(in_file, "r", encoding="utf-8") as f:
+            job.payload = f.read()
 
-    prompt = f"""{AI_RULES}
+    # Prefix and payload go as two text parts: no per-file concatenation
+    prompt = [PROMPT_PREFIX, job.payload]
 
-Now categorize the following data according to the above rules.
-Additional constraints:
-- Split folders >20 links into coherent subgroups.
-- Keep balanced grouping.
-- CRITICAL: Only include `url` and `title` fields.
-- CRITICAL: Avoid folders with only 1 or 2 links.
-
-Return only valid JSON.
-
-{json.dumps(content, ensure_ascii=False, indent=2)}"""
-
-    with locks["status"]:
-        worker_status[worker] = {"file": job.filename, "state": "processing"}
+    worker_slots[worker].set(job.filename, "processing")
 
     for attempt in range(1, MAX_RETRIES + 1):
         if shutdown_event.is_set():
@@ -247,9 +286,9 @@ Return only valid JSON.
 
         try:
             rate_sleep(worker)
-            model = get_model(worker)
+            client = get_client(worker)
            # console.log(f"[DEBUG] Worker {worker} calling API for {job.filename} (attempt {attempt})")
-            r = model.generate_content(prompt)
+            r = client.models.generate_content(model=MODELS[worker.model_type], contents=prompt)
 
             # --- Estrai il testo in modo robusto (0.8.5) ---
             raw_text = None
@@ -267,17 +306,12 @@ Return only valid JSON.
                 raise RuntimeError("Gemini returned no textual content")
 
             # --- Pulisci eventuali code fences ```
-            text = raw_text.strip()
-            if text.startswith("```"):
-                # rimuove eventuale '```json' o simili
-                text = re.sub(r"^```[a-zA-Z0-9]*\n?", "", text)
-            if text.endswith("```"):
-                text = text[: text.rfind("```")].strip()
+            text = clean_response_text(raw_text)
 
             # --- Prova il parse JSON
             try:
-                parsed = json.loads(text)
-            except json.JSONDecodeError as je:
+                parsed = orjson.loads(text)
+            except orjson.JSONDecodeError as je:
                 # Ensure RAW directory exists
                 raw_dir = os.path.join(BASE_DIR, "RAW")
                 os.makedirs(raw_dir, exist_ok=True)
@@ -290,20 +324,15 @@ Return only valid JSON.
                     rf.write(raw_text)
 
                 # Update worker state
-                with locks["status"]:
-                    worker_status[worker] = {"file": job.filename, "state": "raw_saved"}
-                    worker_done[worker] = worker_done.get(worker, 0) + 1
+                worker_slots[worker].set(job.filename, "raw_saved", done=True)
 
                 return True
 
-            # --- Salva JSON valido
-            with open(out_file, "w", encoding="utf-8") as f:
-                json.dump(parsed, f, ensure_ascii=False, indent=2)
+            # --- Salva JSON valido: la scrittura la fa writer_loop, il worker torna subito alle API
+            write_queue.put((out_file, parsed))
 
            # console.log(f"[DEBUG] Worker {worker} SAVED {out_filename}")
-            with locks["status"]:
-                worker_status[worker] = {"file": job.filename, "state": "done"}
-                worker_done[worker] = worker_done.get(worker, 0) + 1
+            worker_slots[worker].set(job.filename, "done", done=True)
             return True
 
         except Exception as e:
@@ -313,8 +342,7 @@ Return only valid JSON.
             if any(x in msg for x in ["429", "quota", "rate limit", "exceeded", "resource exhausted"]):
                 mark_exhausted(worker)
                # console.log(f"[DEBUG] Worker {worker} EXHAUSTED on {job.filename}")
-                with locks["status"]:
-                    worker_status[worker] = {"file": job.filename, "state": "exhausted"}
+                worker_slots[worker].set(job.filename, "exhausted")
                 return False  # job NON consumato → rientra in coda per altri
             # Transienti → backoff
             if any(x in msg for x in ["timeout", "temporarily", "connection", "unavailable", "internal"]):
@@ -323,33 +351,25 @@ Return only valid JSON.
                 continue
             # Altri errori → consumato ma marcato error
            # console.log(f"[DEBUG] Worker {worker} FAILED {job.filename} with unrecoverable error")
-            with locks["status"]:
-                worker_status[worker] = {"file": job.filename, "state": f"error:{type(e).__name__}"}
-                worker_done[worker] = worker_done.get(worker, 0) + 1
+            worker_slots[worker].set(job.filename, f"error:{type(e).__name__}", done=True)
             return True
 
    # console.log(f"[DEBUG] Worker {worker} exhausted retries for {job.filename}")
-    with locks["status"]:
-        worker_status[worker] = {"file": job.filename, "state": "failed"}
-        worker_done[worker] = worker_done.get(worker, 0) + 1
+    worker_slots[worker].set(job.filename, "failed", done=True)
     return True
 
 def worker_loop(worker, q):
-    with locks["status"]:
-        worker_status[worker] = {"file": None, "state": "idle"}
-        worker_done[worker] = 0
+    worker_slots[worker].set(None, "idle")
     
     while not shutdown_event.is_set():
         # Controllo exhausted qui, prima di prendere un nuovo job
         if is_exhausted(worker):
-            with locks["status"]:
-                worker_status[worker] = {"file": None, "state": "exhausted"}
+            worker_slots[worker].set(None, "exhausted")
             break
         
         try:
             # Calcola il timeout dinamicamente basato sul rate limiting
-            with locks["flash"]:
-                rpm = REQUESTS_PER_MIN_BASE[worker.model_type]
+            rpm = REQUESTS_PER_MIN_BASE[worker.model_type]  # immutable: no lock needed
             max_gap = 60.0 / max(1, rpm)
             timeout = max_gap + 5  # Gap massimo + 5 secondi di margine
             
@@ -367,6 +387,7 @@ def worker_loop(worker, q):
             # Job completato con successo - PRIMA task_done POI continua
            # console.log(f"[DEBUG] Worker {worker} marking {job.filename} as done")
             q.task_done()
+            remaining_jobs.add(-1)
             # Continua il loop per prendere il prossimo job
         else:
             # Job non completato (worker exhausted o errore critico)
@@ -378,35 +399,53 @@ def worker_loop(worker, q):
             # Se questo worker è exhausted, usciamo dal loop
             if is_exhausted(worker):
                # console.log(f"[DEBUG] Worker {worker} exiting (exhausted)")
-                with locks["status"]:
-                    worker_status[worker] = {"file": None, "state": "exhausted"}
+                worker_slots[worker].set(None, "exhausted")
                 break
             # Altrimenti continua (potrebbe essere un errore temporaneo)
     
-    with locks["status"]:
-        if worker_status[worker]["state"] not in {"exhausted", "aborted"}:
-            worker_status[worker] = {"file": None, "state": "stopped"}
+    if worker_slots[worker].state not in {"exhausted", "aborted"}:
+        worker_slots[worker].set(None, "stopped")
+
+def writer_loop():
+    """Single disk writer: dumps parsed answers off the API threads, atomically via os.replace."""
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+        out_file, parsed = item
+        tmp_file = out_file + ".tmp"  # not *.json: detect_io_pair never sees it
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(orjson.dumps(parsed, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, out_file)
+        except Exception as e:
+            console.log(f"[red]Write failed for {os.path.basename(out_file)}: {e}[/red]")
 # =========================
 # Rich UI
 # =========================
-def render_dashboard(total, done, start_time, qsize):
-    elapsed = (time.time() - start_time) / 60
-    rate = done / elapsed if elapsed > 0 else 0.0
-    remaining = qsize
-    pct = (done / total * 100) if total else 0
+STATUS_LABELS = (  # state prefix → (label, style); "{spin}"/"{sleep}" are the animations
+    ("processing", "PROCESSING {spin}", "yellow"),
+    ("done", "DONE", "bright_green"),
+    ("exhausted", "EXHAUSTED {sleep}", "bright_red"),
+    ("error", "ERROR", "red"),
+    ("idle", "IDLE {sleep}", "dim"),
+)
+
+def current_frame(frames):
+    """Pick the animation frame from the clock: no shared iterator state to advance."""
+    return frames[int(time.monotonic() / FRAME_SECONDS) % len(frames)]
+
+def build_dashboard():
+    """Build the Rich layout once; returns it with the Text cells refresh_dashboard rewrites."""
+    cells = {name: Text() for name in ("Files", "Remaining", "Active", "Rate", "Elapsed")}
 
-    with locks["status"]:
-        active = sum(1 for st in worker_status.values() if st["state"].startswith("processing"))
         # --- Statistics table (horizontal flex) ---
     stats_table = Table(box=box.SQUARE, expand=True, show_header=False, pad_edge=True)
     stats_table.add_column("Metric", justify="left", ratio=2, style="bright_green")
     stats_table.add_column("Value", justify="left", ratio=2, style="green")
+    for name, cell in cells.items():
+        stats_table.add_row(name, cell)
 
-    stats_table.add_row("Files", f"{done}/{total} ({pct:.1f}%)")
-    stats_table.add_row("Remaining", str(remaining))
-    stats_table.add_row("Active", str(active))
-    stats_table.add_row("Rate", f"{rate:.1f}/min")
-    stats_table.add_row("Elapsed", f"{elapsed:.1f}m")
         # --- Workers table (flex layout) ---
     table = Table(
         box=box.SQUARE,
@@ -423,46 +462,17 @@ def render_dashboard(total, done, start_time, qsize):
     table.add_column("Done", justify="center", ratio=1)
     table.add_column("Status", justify="left", ratio=2)
     table.add_column("File", justify="left", ratio=3)
-    spin = next(working_cycle)
-    sleep = next(exhausted_cycle)
-
-    with locks["status"], locks["flash"]:
-        total_keys = len(API_KEYS)
-        for k_idx, key in enumerate(API_KEYS, start=1):
-            key_suffix = "..." + key[-6:]
-
-            # --- righe Flash + Pro ---
-            for model in ("flash", "pro"):
-                w = WorkerId(k_idx - 1, model)
-                st = worker_status.get(w, {"file": None, "state": "idle"})
-                done_w = worker_done.get(w, 0)
-                rpm = REQUESTS_PER_MIN_BASE[model]
-                state = st["state"]
-
-                if state.startswith("processing"):
-                    s = Text(f"PROCESSING {spin}", style="yellow")
-                elif state.startswith("done"):
-                    s = Text("DONE", style="bright_green")
-                elif state.startswith("exhausted"):
-                    s = Text(f"EXHAUSTED {sleep}", style="bright_red")
-                elif state.startswith("error"):
-                    s = Text("ERROR", style="red")
-                elif state.startswith("idle"):
-                    s = Text(f"IDLE {sleep}", style="dim")
-                else:
-                    s = Text(state.upper(), style="dim")
-
-                key_label = f"#{k_idx} {key_suffix}" if model == "flash" else ""
-
-                table.add_row(
-                    key_label,
-                    model.upper(),
-                    str(rpm),
-                    str(done_w),
-                    s,
-                    st["file"] or "-"
-                )
-                
+
+    for k_idx, key in enumerate(API_KEYS, start=1):
+        key_suffix = "..." + key[-6:]
+
+        # --- righe Flash + Pro: Done / Status / File are the only mutable cells ---
+        for model in ("flash", "pro"):
+            row = (Text(), Text(), Text())
+            cells[WorkerId(k_idx - 1, model)] = row
+            key_label = f"#{k_idx} {key_suffix}" if model == "flash" else ""
+            table.add_row(key_label, model.upper(), str(REQUESTS_PER_MIN_BASE[model]), *row)
+            
     layout = Table.grid(expand=True)
 
     # Create header panel
@@ -500,7 +510,39 @@ def render_dashboard(total, done, start_time, qsize):
         )
     )
 
-    return layout
+    return layout, cells
+
+def refresh_dashboard(cells, total, done, start_time, remaining):
+    """Rewrite the mutable cells in place; Live re-renders the same layout on its own."""
+    elapsed = (time.time() - start_time) / 60
+    rate = done / elapsed if elapsed > 0 else 0.0
+    pct = (done / total * 100) if total else 0
+    spin = current_frame(WORKING_FRAMES)
+    sleep = current_frame(EXHAUSTED_FRAMES)
+
+    # No lock: each slot is owned by one worker, a torn read only lasts one frame
+    active = 0
+    for w, st in worker_slots.items():
+        done_cell, status_cell, file_cell = cells[w]
+        state = st.state
+        for prefix, label, style in STATUS_LABELS:
+            if state.startswith(prefix):
+                status_cell.plain = label.format(spin=spin, sleep=sleep)
+                status_cell.style = style
+                break
+        else:
+            status_cell.plain = state.upper()
+            status_cell.style = "dim"
+        if state.startswith("processing"):
+            active += 1
+        done_cell.plain = str(st.done)
+        file_cell.plain = st.file or "-"
+
+    cells["Files"].plain = f"{done}/{total} ({pct:.1f}%)"
+    cells["Remaining"].plain = str(remaining)
+    cells["Active"].plain = str(active)
+    cells["Rate"].plain = f"{rate:.1f}/min"
+    cells["Elapsed"].plain = f"{elapsed:.1f}m"
 
 # =========================
 # Main
@@ -530,50 +572,64 @@ def main():
     start = time.time()
     in_path, out_path, remaining = detect_io_pair(BASE_DIR)
     q = build_queue(in_path, out_path, remaining)
-    total = q.qsize()
+    total = remaining_jobs.value
 
-    for k in range(len(API_KEYS)):
+    for k, api_key in enumerate(API_KEYS):
+        clients[k] = genai.Client(api_key=api_key)
         for mt in ("flash", "pro"):
             exhausted[(k, mt)] = False
-            last_call_ts[(k, mt)] = 0.0
+            worker_slots[WorkerId(k, mt)] = WorkerState()
+            buckets[(k, mt)] = TokenBucket(rate=max(1, REQUESTS_PER_MIN_BASE[mt]) / 60.0)
 
     # ------------------------
     # Threads (spawn only selected model types)
     # ------------------------
-    threads = []
-    for k in range(len(API_KEYS)):
-        for mt in active_models:
-            w = WorkerId(k, mt)
-            t = threading.Thread(target=worker_loop, args=(w, q), daemon=True)
-            t.start()
-            threads.append(t)
-
-    # ------------------------
-    # Dashboard
-    # ------------------------
-    with Live(
-        render_dashboard(total, 0, start, q.qsize()),
-        console=console,
-        refresh_per_second=4,
-        transient=False,
-        redirect_stdout=False,
-        redirect_stderr=False,
-    ) as live:
-        done_last = 0
-        while any(t.is_alive() for t in threads):
-            if shutdown_event.is_set():
-                break
-            done_now = sum(worker_done.values())
-            if done_now != done_last:
-                done_last = done_now
-            live.update(render_dashboard(total, done_now, start, q.qsize()))
-            time.sleep(0.2)
-
-    for t in threads:
-        t.join(timeout=1.0)
-
-    console.print(render_dashboard(total, sum(worker_done.values()), start, q.qsize()))
-    console.print(f"[green]Completed {sum(worker_done.values())}/{total} files.[/green]")
+    writer = threading.Thread(target=writer_loop)
+    writer.start()
+
+    threads = {}  # Thread → WorkerId
+    try:
+        for k in range(len(API_KEYS)):
+            for mt in active_models:
+                w = WorkerId(k, mt)
+                t = threading.Thread(target=worker_loop, args=(w, q), daemon=True)
+                t.start()
+                threads[t] = w
+
+        # ------------------------
+        # Dashboard
+        # ------------------------
+        layout, cells = build_dashboard()
+        refresh_dashboard(cells, total, 0, start, remaining_jobs.value)
+        with Live(
+            layout,
+            console=console,
+            refresh_per_second=4,
+            transient=False,
+            redirect_stdout=False,
+            redirect_stderr=False,
+        ):
+            while any(t.is_alive() for t in threads):
+                if shutdown_event.is_set():
+                    break
+                # Plain loads of the shared counters: no Queue mutex, no per-frame sum
+                refresh_dashboard(cells, total, done_total.value, start, remaining_jobs.value)
+                time.sleep(0.2)
+    finally:
+        # Stop the workers (no-op after a normal run), then wait for every one still
+        # inside a job: only those can still put answers on write_queue. Idle ones may
+        # sit in q.get() for a while and just die with the process (daemon threads).
+        shutdown_event.set()
+        while any(t.is_alive() and worker_slots[w].state.startswith("processing")
+                  for t, w in threads.items()):
+            time.sleep(0.1)
+        # No producer left: the sentinel lands after every queued answer
+        write_queue.put(None)
+        writer.join()
+
+    refresh_dashboard(cells, total, done_total.value, start, remaining_jobs.value)
+    console.print(layout)
+    console.print(f"[green]Completed {done_total.value}/{total} files.[/green]")
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,13 @@
-import json
-import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+import httpx
+import httpcore
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from selectolax.lexbor import LexborHTMLParser
+import socket
+import time
+from collections import OrderedDict
 import re
 import os
 
@@ -12,48 +18,141 @@ import os
 
 INPUT_FILE = "./json_lists/working.json"
 OUTPUT_FILE = "./json_lists/working_expanded.json"
+CHECKPOINT_FILE = "./json_lists/working_expanded.jsonl"  # append-only NDJSON, merged into OUTPUT_FILE at the end
+URLS_INDEX_FILE = "./json_lists/working_expanded_urls.txt"  # one URL per line, mirrors OUTPUT_FILE
+BATCH_SAVE = 20  # flush the checkpoint every N new records
 TIMEOUT = 10
-MAX_WORKERS = 10
+MAX_CONCURRENCY = 64  # requests in flight at the same time
+MAX_BYTES = 65536  # enough for <head> metadata + the start of <body>
+PREVIEW_CHARS = 150
+WS_RE = re.compile(r'\s+')
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Range': f'bytes=0-{MAX_BYTES - 1}',
+}
+
+DNS_TTL = 300  # seconds a resolved host is reused before asking the resolver again
+DNS_CACHE_SIZE = 4096  # hosts kept in the DNS cache (least recently used are dropped)
+
+
+# ==============================================================
+# HTTP CLIENT / DNS CACHE
+# ==============================================================
+
+class CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that resolves hosts through a bounded TTL cache:
+    bookmark lists hit the same hosts many times, and every new connection
+    otherwise goes back to the system resolver. Failures are not cached.
+    """
+
+    def __init__(self, ttl=DNS_TTL, maxsize=DNS_CACHE_SIZE):
+        self._backend = httpcore.AnyIOBackend()
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._cache = OrderedDict()  # (host, port) -> (expires_at, [ip, ...])
+
+    async def resolve(self, host, port, timeout=None):
+        key = (host, port)
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry and entry[0] > now:
+            self._cache.move_to_end(key)
+            return entry[1]
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise httpcore.ConnectError(f"DNS lookup failed for {host}: {e}") from e
+        # dict.fromkeys: unique addresses, resolver order preserved
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (now + self._ttl, addrs)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+        return addrs
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        error = None
+        for addr in await self.resolve(host, port, timeout):
+            try:
+                # TLS still uses the original host name for SNI and certificate checks
+                return await self._backend.connect_tcp(
+                    addr, port, timeout=timeout,
+                    local_address=local_address, socket_options=socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        raise error or httpcore.ConnectError(f"No address found for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+class CachedDNSTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connection pool connects through CachedDNSBackend."""
+
+    def __init__(self, limits, http2=True):
+        super().__init__(http2=http2, limits=limits)
+        # httpx.AsyncHTTPTransport has no network_backend argument: rebuild its
+        # pool with the same settings plus the caching backend.
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachedDNSBackend(),
+        )
 
 
 # ==============================================================
 # TEXT CLEANING / UNICODE SANITIZATION
 # ==============================================================
 
+# Ambiguous Unicode characters → ASCII equivalents
+UNICODE_REPLACEMENTS = {
+    "\u2013": "-",   # en dash
+    "\u2014": "-",   # em dash
+    "\u2018": "'",   # single quote open
+    "\u2019": "'",   # single quote close
+    "\u201C": '"',   # double quote open
+    "\u201D": '"',   # double quote close
+    "\u2026": "...", # ellipsis
+    "\u2212": "-",   # minus sign
+    "\u00A0": " ",   # non-breaking space
+    "\u202F": " ",   # narrow no-break space
+}
+SANITIZE_TABLE = str.maketrans(UNICODE_REPLACEMENTS)
+# Same table plus invisible separators: clean_text does a single translate() pass
+CLEAN_TABLE = str.maketrans({
+    **UNICODE_REPLACEMENTS,
+    "\u2028": " ",   # line separator
+    "\u2029": " ",   # paragraph separator
+    "\ufeff": "",    # BOM
+    "\u200b": "",    # zero-width space
+})
+
+
 def sanitize_unicode(s: str) -> str:
     """Replace ambiguous Unicode characters with ASCII equivalents."""
     if not isinstance(s, str):
         return s
-    replacements = {
-        "\u2013": "-",   # en dash
-        "\u2014": "-",   # em dash
-        "\u2018": "'",   # single quote open
-        "\u2019": "'",   # single quote close
-        "\u201C": '"',   # double quote open
-        "\u201D": '"',   # double quote close
-        "\u2026": "...", # ellipsis
-        "\u2212": "-",   # minus sign
-        "\u00A0": " ",   # non-breaking space
-        "\u202F": " ",   # narrow no-break space
-    }
-    for bad, good in replacements.items():
-        s = s.replace(bad, good)
-    return s
+    return s.translate(SANITIZE_TABLE)
 
 
 def clean_text(value: str) -> str:
     """Remove invisible or invalid Unicode characters and normalize spaces."""
     if not value:
         return ""
-    value = sanitize_unicode(value)
-    cleaned = (
-        value.replace("\u2028", " ")
-             .replace("\u2029", " ")
-             .replace("\ufeff", "")
-             .replace("\u200b", "")
-             .strip()
-    )
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    cleaned = value.translate(CLEAN_TABLE).strip()
+    cleaned = WS_RE.sub(' ', cleaned)
     return cleaned
 
 
@@ -61,153 +160,273 @@ def clean_text(value: str) -> str:
 # HTML EXTRACTION
 # ==============================================================
 
-def extract_text_content(soup):
-    """Extracts the first 150 chars of readable body text."""
-    for tag in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-        tag.decompose()
-    body = soup.find('body')
+def extract_text_content(tree):
+    """Extracts the first PREVIEW_CHARS chars of readable body text."""
+    tree.strip_tags(['script', 'style', 'nav', 'header', 'footer', 'aside'])
+    body = tree.body
     if not body:
         return ""
-    text = body.get_text(separator=' ', strip=True)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text[:150] if text else ""
+    # Only the first PREVIEW_CHARS survive: don't collapse whitespace over the whole page
+    text = body.text(separator=' ', strip=True)[:4096]
+    text = WS_RE.sub(' ', text).strip()
+    return text[:PREVIEW_CHARS]
 
 
 # ==============================================================
 # SCRAPER
 # ==============================================================
 
-def contains_error_content(*parts) -> bool:
-    """Detect 'error' or '404' messages in content."""
-    joined = " ".join(p.lower() for p in parts if p)
-    patterns = [
-        "error",
-        "404",
-        "not found",
-        "page not found",
-        "server error",
-        "an error has occurred",
-        "forbidden",
-    ]
-    return any(p in joined for p in patterns)
-
-
-def scrape_url(url):
-    """Scrape single URL with timeout and full cleaning."""
+ERROR_PATTERNS = [
+    "error",
+    "404",
+    "not found",
+    "page not found",
+    "server error",
+    "an error has occurred",
+    "forbidden",
+]
+# One alternation scanned in a single pass instead of one substring search per pattern
+ERROR_RE = re.compile("|".join(map(re.escape, ERROR_PATTERNS)))
+
+
+# Skip reasons: parse_page runs in pool workers, so it returns one of these
+# and main prints it next to the URL's "Checking" line
+SKIP_EMPTY = "⚪ Empty content → {url}"
+SKIP_ERROR_PAGE = "⚠️ Error/404 detected → {url}"
+SKIP_FAILED = "❌ Error on {url}: {error}"
+
+
+def contains_error_content(text_lower) -> bool:
+    """Detect 'error' or '404' messages in already lower-cased content."""
+    return ERROR_RE.search(text_lower) is not None
+
+
+def parse_page(url, raw):
+    """
+    Extract and clean title, description and preview from the downloaded bytes.
+    Returns (record, None), or (None, skip reason) when the page is not kept.
+    """
+    tree = LexborHTMLParser(raw)
+
+    title_tag = tree.css_first('title')
+    title = title_tag.text().strip() if title_tag else ""
+
+    meta_desc = tree.css_first('meta[name="description"]')
+    if not meta_desc:
+        meta_desc = tree.css_first('meta[property="og:description"]')
+    description = (meta_desc.attributes.get('content') or '').strip() if meta_desc else ""
+
+    body_text = extract_text_content(tree)
+
+    # Clean up all text fields
+    title = clean_text(title)
+    description = clean_text(description)
+    body_text = clean_text(body_text)
+
+    # Skip pages with no useful content
+    if not (title or description or body_text):
+        return None, SKIP_EMPTY
+
+    # Skip error or 404 pages: fields joined and lower-cased once
+    combined_lower = " ".join(p for p in (title, description, body_text) if p).lower()
+    if contains_error_content(combined_lower):
+        return None, SKIP_ERROR_PAGE
+
+    # Replace empty fields with 'void'
+    title = title if title else "void"
+    description = description if description else "void"
+    body_text = body_text if body_text else "void"
+
+    return {
+        'url': url,
+        'title': title,
+        'description': description,
+        'preview': body_text
+    }, None
+
+
+async def scrape_url(client, sem, pool, url):
+    """
+    Scrape single URL with timeout, bounded download and full cleaning.
+    Returns (url, record, None), or (url, None, message) when the URL is skipped.
+    """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        response = requests.get(url, timeout=TIMEOUT, headers=headers, allow_redirects=True)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        title_tag = soup.find('title')
-        title = title_tag.get_text().strip() if title_tag else ""
-
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if not meta_desc:
-            meta_desc = soup.find('meta', attrs={'property': 'og:description'})
-        description = meta_desc.get('content', '').strip() if meta_desc else ""
+        # Only the first MAX_BYTES are needed for a 150-char preview:
+        # stream the body and drop the connection after that.
+        async with sem:
+            raw = bytearray()
+            async with client.stream('GET', url, headers=HEADERS) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    raw += chunk
+                    if len(raw) >= MAX_BYTES:
+                        break
+
+        # Parsing is CPU work: run it on the process pool, one core per parser
+        loop = asyncio.get_running_loop()
+        record, skip = await loop.run_in_executor(pool, parse_page, url, bytes(raw[:MAX_BYTES]))
+        if skip:
+            return url, None, skip.format(url=url)
+        return url, record, None
 
-        body_text = extract_text_content(soup)
-
-        # Clean up all text fields
-        title = clean_text(title)
-        description = clean_text(description)
-        body_text = clean_text(body_text)
+    except Exception as e:
+        return url, None, SKIP_FAILED.format(url=url, error=e)
 
-        # Skip pages with no useful content
-        if not (title or description or body_text):
-            print(f"  ⚪ Empty content → {url}")
-            return None
 
-        # Skip error or 404 pages
-        if contains_error_content(title, description, body_text):
-            print(f"  ⚠️ Error/404 detected → {url}")
-            return None
+# ==============================================================
+# EXISTING OUTPUT / CHECKPOINT
+# ==============================================================
 
-        # Replace empty fields with 'void'
-        title = title if title else "void"
-        description = description if description else "void"
-        body_text = body_text if body_text else "void"
+def load_existing_data():
+    """Parse OUTPUT_FILE; [] if it is missing, None if it is invalid JSON."""
+    if not os.path.exists(OUTPUT_FILE):
+        return []
+    try:
+        with open(OUTPUT_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except orjson.JSONDecodeError:
+        print(f"⚠️  {OUTPUT_FILE} is invalid JSON, will be overwritten")
+        return None
 
-        return {
-            'url': url,
-            'title': title,
-            'description': description,
-            'preview': body_text
-        }
 
-    except Exception as e:
-        print(f"  ❌ Error on {url}: {e}")
-        return None
+def load_existing_urls():
+    """
+    URLs already expanded in OUTPUT_FILE, the parsed data if it had to be read,
+    and whether new records may be appended to OUTPUT_FILE in place.
+    The sidecar index is used when it is at least as recent as OUTPUT_FILE,
+    so dedupe never needs the full JSON parse.
+    """
+    if not os.path.exists(OUTPUT_FILE):
+        return set(), [], False
+    if (os.path.exists(URLS_INDEX_FILE)
+            and os.path.getmtime(URLS_INDEX_FILE) >= os.path.getmtime(OUTPUT_FILE)):
+        with open(URLS_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return set(f.read().splitlines()), None, True
+    existing_data = load_existing_data()
+    if existing_data is None:
+        # Invalid JSON: the file is rewritten from scratch, never appended to
+        return set(), [], False
+    return {item['url'] for item in existing_data}, existing_data, True
+
+
+def save_urls_index(urls):
+    """Rewrite the sidecar index; called right after OUTPUT_FILE so it stays fresh."""
+    with open(URLS_INDEX_FILE, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        f.write(''.join(url + '\n' for url in urls))
+
+
+def append_to_output(records):
+    """
+    Append records to the JSON array in OUTPUT_FILE in place: existing entries are
+    neither parsed nor rewritten. Returns False when the file does not end like
+    a JSON array, so the caller can fall back to a full write.
+    """
+    body = b',\n'.join(
+        b'  ' + orjson.dumps(r, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n  ')
+        for r in records
+    )
+    with open(OUTPUT_FILE, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        tail_start = max(0, size - 64)
+        f.seek(tail_start)
+        tail = f.read().rstrip()
+        if not tail.endswith(b']'):
+            return False
+        last = tail[:-1].rstrip()  # up to the last '}' (or the '[' of an empty array)
+        if not last:
+            return False
+        f.seek(tail_start + len(last))
+        f.write((b'\n' if last.endswith(b'[') else b',\n') + body + b'\n]')
+        f.truncate()
+    return True
+
+
+def load_checkpoint(path):
+    """Load records appended by an interrupted run (one JSON object per line)."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                pass  # truncated last line
+    return records
 
 
 # ==============================================================
 # MAIN
 # ==============================================================
 
-def main():
+async def main():
     # Load input file
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(INPUT_FILE, 'rb') as f:
+            data = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"❌ Input file {INPUT_FILE} not found!")
         return
 
     urls = data.get("urls", []) if isinstance(data, dict) else data
 
-    # Load existing data
-    existing_data = []
-    existing_urls = set()
-    if os.path.exists(OUTPUT_FILE):
-        try:
-            with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-                existing_urls = {item['url'] for item in existing_data}
-            print(f"✅ Found {len(existing_data)} already expanded URLs in {OUTPUT_FILE}")
-        except json.JSONDecodeError:
-            print(f"⚠️  {OUTPUT_FILE} is invalid JSON, will be overwritten")
+    # Load existing URLs (existing_data stays None until it is actually needed)
+    existing_urls, existing_data, appendable = load_existing_urls()
+    if existing_urls:
+        print(f"✅ Found {len(existing_urls)} already expanded URLs in {OUTPUT_FILE}")
+
+    # Records scraped by an interrupted run are merged as new results
+    new_results = [r for r in load_checkpoint(CHECKPOINT_FILE) if r['url'] not in existing_urls]
+    if new_results:
+        existing_urls.update(r['url'] for r in new_results)
+        print(f"♻️  Recovered {len(new_results)} records from {CHECKPOINT_FILE}")
 
     urls_to_process = [url for url in urls if url not in existing_urls]
-    if not urls_to_process:
+    if not urls_to_process and not new_results:
         print("\n✅ All URLs are already expanded!")
         return
 
     print(f"\n📋 Total URLs: {len(urls)}")
     print(f"   Already expanded: {len(existing_urls)}")
     print(f"   To process: {len(urls_to_process)}")
-    print(f"\n🚀 Starting expansion with {MAX_WORKERS} threads...\n")
-
-    new_results = []
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_url = {executor.submit(scrape_url, url): url for url in urls_to_process}
-        for i, future in enumerate(as_completed(future_to_url), 1):
-            url = future_to_url[future]
-            print(f"[{i}/{len(urls_to_process)}] Checking {url} ...")
-            result = future.result()
-            if result:
-                new_results.append(result)
-                print("  ✅ Added")
-            else:
-                print("  ❌ Skipped")
-
-    all_results = existing_data + new_results
-
-    # Final cleaning of the output JSON
-    json_text = json.dumps(all_results, indent=2, ensure_ascii=False)
-    json_text = clean_text(json_text)
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(json_text)
+    print(f"\n🚀 Starting expansion with {MAX_CONCURRENCY} concurrent requests...\n")
+
+    # New records are only appended to the checkpoint; the full JSON is written once at the end
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+    # "spawn": the event loop already runs resolver threads, which fork() would copy mid-state
+    pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+    with pool, open(CHECKPOINT_FILE, 'ab', buffering=1 << 20) as checkpoint:
+        async with httpx.AsyncClient(transport=CachedDNSTransport(limits), follow_redirects=True,
+                                     timeout=TIMEOUT) as client:
+            tasks = [scrape_url(client, sem, pool, url) for url in urls_to_process]
+            for i, coro in enumerate(asyncio.as_completed(tasks), 1):
+                url, result, skip = await coro
+                print(f"[{i}/{len(urls_to_process)}] Checking {url} ...")
+                if result:
+                    new_results.append(result)
+                    checkpoint.write(orjson.dumps(result) + b'\n')
+                    if len(new_results) % BATCH_SAVE == 0:
+                        checkpoint.flush()
+                    print("  ✅ Added")
+                else:
+                    print(f"  {skip}")
+                    print("  ❌ Skipped")
+
+    # New records are appended to the existing array; the full parse + rewrite
+    # only happens when OUTPUT_FILE is missing, invalid or does not end like an array.
+    # Fields are cleaned per record in scrape_url: the JSON keeps its indentation
+    if not appendable or (new_results and not append_to_output(new_results)):
+        if existing_data is None:
+            existing_data = load_existing_data() or []
+        with open(OUTPUT_FILE, 'wb') as f:
+            f.write(orjson.dumps(existing_data + new_results, option=orjson.OPT_INDENT_2))
+    existing_urls.update(r['url'] for r in new_results)
+    save_urls_index(existing_urls)
+    os.remove(CHECKPOINT_FILE)
 
     print(f"\n✅ Done!")
-    print(f"   Total expanded: {len(all_results)}")
+    print(f"   Total expanded: {len(existing_urls)}")
     print(f"   New added: {len(new_results)}")
     print(f"   Saved to: {OUTPUT_FILE}")
 
@@ -217,4 +436,4 @@ def main():
 # ==============================================================
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
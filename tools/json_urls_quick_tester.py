@@ -1,64 +1,54 @@
-import json
-import requests
+import orjson
+import asyncio
+import aiohttp
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import time
 
 # Configurazione
 INPUT_FILE = "./url_resources/bookmark_json_batch.json"
 OUTPUT_FILE = "./json_lists/working.json"
+PROGRESS_FILE = "./json_lists/working.jsonl"  # log append-only, consolidato in OUTPUT_FILE a fine run
 TIMEOUT = 1
-MAX_WORKERS = 30  # thread paralleli
+MAX_CONCURRENCY = 500  # richieste HEAD in volo contemporaneamente
 BATCH_SAVE = 15   # salva ogni N URL trovati
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
 
-# Session globale con connection pooling
-session = None
-
-def get_session():
-    """Crea una session riutilizzabile con connection pooling"""
-    global session
-    if session is None:
-        session = requests.Session()
-        retry = Retry(total=0, backoff_factor=0)
-        adapter = HTTPAdapter(
-            max_retries=retry,
-            pool_connections=MAX_WORKERS,
-            pool_maxsize=MAX_WORKERS * 2
-        )
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-    return session
-
-def is_working(url, timeout=TIMEOUT):
+async def is_working(session, sem, url):
     """Verifica se un URL è raggiungibile"""
-    try:
-        sess = get_session()
-        # Usa HEAD per essere più veloce
-        r = sess.head(
-            url, 
-            allow_redirects=True, 
-            timeout=timeout,
-            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        )
-        return 200 <= r.status_code < 400
-    except Exception:
-        return False
+    async with sem:
+        try:
+            # Usa HEAD per essere più veloce
+            async with session.head(url, allow_redirects=True, headers=HEADERS) as r:
+                return url, 200 <= r.status < 400
+        except Exception:
+            return url, False
+
+def load_progress(progress_file):
+    """Carica gli URL registrati nel log JSONL da un run interrotto"""
+    if not os.path.exists(progress_file):
+        return set()
+    recovered = set()
+    with open(progress_file, "rb") as f:
+        for line in f:
+            try:
+                recovered.add(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                pass  # riga troncata da un'interruzione
+    return recovered
 
 def save_results(working_set, output_file):
-    """Salva i risultati su file"""
-    working_list = sorted(list(working_set))
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(working_list, f, ensure_ascii=False, indent=2)
+    """Salva i risultati su file (una sola volta, a fine run)"""
+    working_list = sorted(working_set)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(working_list, option=orjson.OPT_INDENT_2))
 
-def main():
+async def main():
     start_time = time.time()
     
     # Step 1: Leggi il file di input
     print(f"📂 Lettura file: {INPUT_FILE}")
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(INPUT_FILE, "rb") as f:
+        data = orjson.loads(f.read())
 
     # Estrai lista di URL
     if isinstance(data, dict):
@@ -72,17 +62,25 @@ def main():
     existing_urls = set()
     if os.path.exists(OUTPUT_FILE):
         try:
-            with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-                existing_urls = set(json.load(f))
+            with open(OUTPUT_FILE, "rb") as f:
+                existing_urls = set(orjson.loads(f.read()))
             print(f"📋 Trovati {len(existing_urls)} URL già verificati")
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             print(f"⚠️  {OUTPUT_FILE} non valido, verrà sovrascritto")
+
+    recovered = load_progress(PROGRESS_FILE) - existing_urls
+    if recovered:
+        existing_urls |= recovered
+        print(f"♻️  Recuperati {len(recovered)} URL da {PROGRESS_FILE}")
     
     # Step 3: Filtra URL già verificati
     urls_to_test = [u for u in urls if u not in existing_urls]
     print(f"🔍 URL da verificare: {len(urls_to_test)}")
     
     if not urls_to_test:
+        if recovered:
+            save_results(existing_urls, OUTPUT_FILE)
+            os.remove(PROGRESS_FILE)
         print("✅ Tutti gli URL sono già stati verificati!")
         return
 
@@ -92,38 +90,37 @@ def main():
     tested = 0
     failed = 0
     
-    print(f"\n🚀 Inizio verifica con {MAX_WORKERS} thread paralleli...\n")
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Sottometti tutti i task
-        future_to_url = {
-            executor.submit(is_working, url): url 
-            for url in urls_to_test
-        }
-        
-        # Processa i risultati man mano che arrivano
-        for future in as_completed(future_to_url):
-            url = future_to_url[future]
-            tested += 1
-            
-            try:
-                is_ok = future.result()
-                
+    print(f"\n🚀 Inizio verifica con {MAX_CONCURRENCY} richieste concorrenti...\n")
+
+    # Un solo event loop gestisce tutti i socket: niente thread né GIL
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+
+    # I nuovi URL vengono solo accodati al log: niente riscrittura completa ad ogni batch
+    with open(PROGRESS_FILE, "ab", buffering=1 << 20) as log:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = [is_working(session, sem, url) for url in urls_to_test]
+
+            # Processa i risultati man mano che arrivano
+            for next_done in asyncio.as_completed(tasks):
+                url, is_ok = await next_done
+                tested += 1
+
                 if is_ok:
-                    status = "✅"
                     working_set.add(url)
                     newly_added += 1
-                    
+                    log.write(orjson.dumps(url) + b"\n")
+
                     # Salva periodicamente
                     if newly_added % BATCH_SAVE == 0:
-                        save_results(working_set, OUTPUT_FILE)
+                        log.flush()
                         elapsed = time.time() - start_time
                         rate = tested / elapsed if elapsed > 0 else 0
                         print(f"💾 [{tested}/{len(urls_to_test)}] Salvati {len(working_set)} URL | {rate:.1f} URL/s")
                 else:
-                    status = "❌"
                     failed += 1
-                
+
                 # Mostra progresso ogni 50 URL
                 if tested % 50 == 0:
                     elapsed = time.time() - start_time
@@ -132,13 +129,10 @@ def main():
                     print(f"📊 Progresso: {tested}/{len(urls_to_test)} ({tested/len(urls_to_test)*100:.1f}%) | "
                           f"Funzionanti: {newly_added} | Falliti: {failed} | "
                           f"Velocità: {rate:.1f} URL/s | ETA: {eta/60:.1f}m")
-                        
-            except Exception as e:
-                print(f"⚠️  Errore su {url}: {e}")
-                failed += 1
-    
-    # Salvataggio finale
+
+    # Salvataggio finale: consolida il log nel JSON ordinato
     save_results(working_set, OUTPUT_FILE)
+    os.remove(PROGRESS_FILE)
     
     # Statistiche finali
     elapsed = time.time() - start_time
@@ -155,4 +149,4 @@ def main():
     print(f"{'='*70}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
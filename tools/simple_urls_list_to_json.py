@@ -1,6 +1,7 @@
 import json
+import re
 from urllib.parse import urlparse
-from collections import defaultdict
+from collections import Counter
 
 input_file = "./url_resources_urls.txt"
 output_file = "./url_resources_simple_to_json.json"
@@ -18,64 +19,92 @@ IGNORED_KEYWORDS = [
     "google", "youtube", "ytcreator", "teamyoutube", "ytcreators"
 ]
 
-def get_domain(url):
-    """Estrae il dominio da un URL"""
-    try:
-        parsed = urlparse(url)
-        return parsed.netloc.lower()
-    except:
-        return None
-
-def should_ignore(url, domain):
-    """Verifica se l'URL o il dominio devono essere ignorati"""
+# Liste compilate una volta: una regex per le parole chiave, set + tupla di suffissi per i domini
+KEYWORD_RE = re.compile("|".join(map(re.escape, IGNORED_KEYWORDS)))
+IGNORED_DOMAINS_SET = frozenset(IGNORED_DOMAINS)
+IGNORED_SUFFIXES = tuple("." + d for d in IGNORED_DOMAINS)
+
+# Netloc di "scheme://host/..." senza costruire un ParseResult; i caratteri che
+# urlparse ripulisce (tab/CR/LF, spazi iniziali) o valida ([...] IPv6, netloc
+# non ASCII con il controllo NFKC) passano da urlparse
+NETLOC_RE = re.compile(r"(?:[a-z][a-z0-9+.-]*:)?//([^/?#]*)")
+SPECIAL_RE = re.compile(r"[\t\r\n\[\]\x80-\U0010ffff]|^[\x00-\x20]")
+
+def get_domain(url_lower):
+    """Estrae il dominio da un URL già in minuscolo"""
+    if SPECIAL_RE.search(url_lower):
+        try:
+            return urlparse(url_lower).netloc
+        except:
+            return None
+    m = NETLOC_RE.match(url_lower)
+    return m.group(1) if m else ""
+
+def should_ignore(url_lower, domain):
+    """Verifica se l'URL (già in minuscolo) o il dominio devono essere ignorati"""
     if not domain:
         return True
 
     # Escludi se contiene parole chiave specifiche ovunque
-    url_lower = url.lower()
-    for keyword in IGNORED_KEYWORDS:
-        if keyword in url_lower:
-            return True
+    if KEYWORD_RE.search(url_lower):
+        return True
 
     # Escludi se dominio è o termina con uno di quelli ignorati
-    for ignored in IGNORED_DOMAINS:
-        if domain == ignored or domain.endswith('.' + ignored):
-            return True
-
-    return False
+    return domain in IGNORED_DOMAINS_SET or domain.endswith(IGNORED_SUFFIXES)
 
 
 # Dizionari di conteggio
-domain_count = defaultdict(int)
+domain_count = Counter()
 urls = []
-skipped = defaultdict(int)
-ignored = defaultdict(int)
+skipped = Counter()
+ignored = Counter()
+full_domains = set()  # domini già a MAX_PER_DOMAIN URL mantenuti
+invalid_log = []  # avvisi stampati in blocco a fine ciclo, non una print per riga
 
 print(f"📂 Lettura file: {input_file}\n")
 
 with open(input_file, "r", encoding="utf-8") as f:
-    for line_num, line in enumerate(f, 1):
-        url = line.strip()
-        if not url:
-            continue
-
-        domain = get_domain(url)
-        if not domain:
-            print(f"⚠️  Linea {line_num}: URL non valido ignorato: {url}")
-            continue
-
-        # Controlla se l’URL deve essere ignorato
-        if should_ignore(url, domain):
-            ignored[domain] += 1
-            continue
+    # Una sola read(); split("\n") (non splitlines) taglia le righe come l'iterazione sul file
+    lines = f.read().split("\n")
+
+for line_num, line in enumerate(lines, 1):
+    url = line.strip()
+    if not url:
+        continue
 
-        # Rispetta il limite per dominio
-        if domain_count[domain] >= MAX_PER_DOMAIN:
+    # Un solo lower() per URL, condiviso da get_domain e should_ignore
+    url_lower = url.lower()
+    domain = get_domain(url_lower)
+    if not domain:
+        invalid_log.append(f"⚠️  Linea {line_num}: URL non valido ignorato: {url}")
+        continue
+
+    # Dominio già al limite: basta il controllo per parole chiave (un dominio
+    # ignorato non può avere URL mantenuti), i conteggi restano gli stessi
+    if domain in full_domains:
+        if KEYWORD_RE.search(url_lower):
+            ignored[domain] += 1
+        else:
             skipped[domain] += 1
-            continue
+        continue
+
+    # Controlla se l’URL deve essere ignorato
+    if should_ignore(url_lower, domain):
+        ignored[domain] += 1
+        continue
+
+    # Rispetta il limite per dominio
+    if domain_count[domain] >= MAX_PER_DOMAIN:
+        skipped[domain] += 1
+        continue
+
+    urls.append(url)
+    domain_count[domain] += 1
+    if domain_count[domain] >= MAX_PER_DOMAIN:
+        full_domains.add(domain)
 
-        urls.append(url)
-        domain_count[domain] += 1
+if invalid_log:
+    print("\n".join(invalid_log))
 
 # Salva in JSON
 with open(output_file, "w", encoding="utf-8") as f:
@@ -92,17 +121,17 @@ print(f"   Salvati in:          {output_file}")
 if ignored:
     total_ignored = sum(ignored.values())
     print(f"\n🚫 URL ignorati (Google/YouTube/collegati): {total_ignored}")
-    for domain, count in sorted(ignored.items(), key=lambda x: x[1], reverse=True):
+    for domain, count in ignored.most_common():
         print(f"   {domain}: {count} URL")
 
 if skipped:
     print(f"\n📊 URL saltati per limite ({MAX_PER_DOMAIN} per dominio):")
-    for domain, count in sorted(skipped.items(), key=lambda x: x[1], reverse=True):
+    for domain, count in skipped.most_common():
         print(f"   {domain}: {count} URL saltati ({domain_count[domain]} mantenuti)")
 
 # Top 10 domini
 print(f"\n🏆 Top 10 domini per numero di URL:")
-top_domains = sorted(domain_count.items(), key=lambda x: x[1], reverse=True)[:10]
+top_domains = domain_count.most_common(10)
 for domain, count in top_domains:
     print(f"   {domain}: {count} URL")
 
@@ -1,65 +1,95 @@
 #!/usr/bin/env python3
 import os
-import json
+import orjson
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # === CONFIG ===
 OUT_DIR = "./in_out-s/working_split_OUT--API-1"
 DELETE_SINGLE_THRESHOLD = 3  # più di 3 cartelle con 1 bookmark
 DELETE_DOUBLE_THRESHOLD = 6  # più di 5 cartelle con 2 bookmark
 
-# === ARGPARSE ===
-parser = argparse.ArgumentParser(description="Delete output JSONs with too many small folders")
-parser.add_argument("--apply", action="store_true", help="Actually delete the files (otherwise dry run)")
-args = parser.parse_args()
-
-# === MAIN ===
-deleted_files = []
-checked_files = 0
-
-for filename in sorted(os.listdir(OUT_DIR)):
-    if not filename.startswith("out_") or not filename.endswith(".json"):
-        continue
-
-    file_path = os.path.join(OUT_DIR, filename)
-    checked_files += 1
 
+def classify(file_path):
+    """Conta le cartelle da 1 e 2 bookmark; ritorna (nome, da eliminare, errore di lettura)"""
+    filename = os.path.basename(file_path)
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(file_path, "rb") as f:
+            data = orjson.loads(f.read())
     except Exception as e:
-        print(f"⚠️  Error reading {filename}: {e}")
-        continue
+        return filename, False, str(e)
 
     if not isinstance(data, dict) or "folders" not in data:
-        continue
+        return filename, False, None
+
+    # Un solo passaggio sulle cartelle per entrambi i conteggi,
+    # interrotto appena una delle due soglie è superata
+    count_single = count_double = 0
+    for folder in data.get("folders", []):
+        if not isinstance(folder, dict):
+            continue
+        bookmarks = folder.get("bookmarks")  # niente lista vuota di default per ogni cartella
+        if not bookmarks:
+            continue
+        n = len(bookmarks)
+        if n == 1:
+            count_single += 1
+            if count_single > DELETE_SINGLE_THRESHOLD:
+                return filename, True, None
+        elif n == 2:
+            count_double += 1
+            if count_double > DELETE_DOUBLE_THRESHOLD:
+                return filename, True, None
+
+    return filename, False, None
+
+
+if __name__ == "__main__":
+    # === ARGPARSE ===
+    parser = argparse.ArgumentParser(description="Delete output JSONs with too many small folders")
+    parser.add_argument("--apply", action="store_true", help="Actually delete the files (otherwise dry run)")
+    args = parser.parse_args()
+
+    # === MAIN ===
+    deleted_files = []
+    with os.scandir(OUT_DIR) as it:
+        paths = [
+            e.path
+            for e in sorted(it, key=lambda e: e.name)
+            if e.name.startswith("out_") and e.name.endswith(".json")
+        ]
+    checked_files = len(paths)
 
-    folders = data.get("folders", [])
-    count_single = sum(1 for f in folders if isinstance(f, dict) and len(f.get("bookmarks", [])) == 1)
-    count_double = sum(1 for f in folders if isinstance(f, dict) and len(f.get("bookmarks", [])) == 2)
+    # I file sono indipendenti: un processo per core, risultati nell'ordine di input
+    with ProcessPoolExecutor() as ex:
+        for filename, matches, error in ex.map(classify, paths, chunksize=32):
+            if error is not None:
+                print(f"⚠️  Error reading {filename}: {error}")
+            elif matches:
+                deleted_files.append(filename)
 
-    if count_single > DELETE_SINGLE_THRESHOLD or count_double > DELETE_DOUBLE_THRESHOLD:
-        deleted_files.append(filename)
-        if args.apply:
+    # Cancellazione in blocco, a scansione finita
+    if args.apply:
+        for filename in deleted_files:
             try:
-                os.remove(file_path)
+                os.remove(os.path.join(OUT_DIR, filename))
             except Exception as e:
                 print(f"⚠️  Error deleting {filename}: {e}")
 
-# === REPORT ===
-mode = "APPLY (deletion performed)" if args.apply else "DRY RUN (no files deleted)"
-print("\n=== DELETION REPORT ===")
-print(f"📂 Directory: {OUT_DIR}")
-print(f"🧩 Files checked: {checked_files}")
-print(f"⚙️  Mode: {mode}")
-print(f"🗑️  Files matching criteria: {len(deleted_files)}")
+    # === REPORT ===
+    mode = "APPLY (deletion performed)" if args.apply else "DRY RUN (no files deleted)"
+    print("\n=== DELETION REPORT ===")
+    print(f"📂 Directory: {OUT_DIR}")
+    print(f"🧩 Files checked: {checked_files}")
+    print(f"⚙️  Mode: {mode}")
+    print(f"🗑️  Files matching criteria: {len(deleted_files)}")
 
-if deleted_files:
-    print("\nMatching files:")
-    for name in deleted_files:
-        print(f"  • {name}")
+    if deleted_files:
+        print("\nMatching files:")
+        for name in deleted_files:
+            print(f"  • {name}")
 
-if not args.apply:
-    print("\n💡 Run again with '--apply' to actually delete these files.\n")
-else:
-    print("\n✅ Deletion completed.\n")
\ No newline at end of file
+    if not args.apply:
+        print("\n💡 Run again with '--apply' to actually delete these files.\n")
+    else:
+        print("\n✅ Deletion completed.\n")
\ No newline at end of file
@@ -3,6 +3,7 @@ import json
 import requests
 import os
 import random
+import bisect
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -64,9 +65,8 @@ def is_working(url, timeout=TIMEOUT):
     except Exception:
         return False
 
-def save_results(working_set, output_file):
-    """Salva i risultati su file"""
-    working_list = sorted(list(working_set))
+def save_results(working_list, output_file):
+    """Salva su file la lista già ordinata"""
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(working_list, f, ensure_ascii=False, indent=2)
 
@@ -100,7 +100,9 @@ def main():
         return
     
     # Step 5: Test parallelo
+    # Lista mantenuta ordinata con insort: niente sort completo ad ogni salvataggio
     working_set = existing_urls.copy()
+    working_sorted = sorted(existing_urls)
     newly_added = 0
     tested = 0
     
@@ -124,19 +126,21 @@ def main():
                 print(f"[{tested}/{len(sampled_urls)}] {status} {url}")
                 
                 if is_ok:
-                    working_set.add(url)
+                    if url not in working_set:
+                        working_set.add(url)
+                        bisect.insort(working_sorted, url)
                     newly_added += 1
                     
                     # Salva periodicamente
                     if newly_added % BATCH_SAVE == 0:
-                        save_results(working_set, OUTPUT_FILE)
+                        save_results(working_sorted, OUTPUT_FILE)
                         print(f"💾 Salvati {len(working_set)} URL")
                         
             except Exception as e:
                 print(f"[{tested}/{len(sampled_urls)}] ⚠️  Errore su {url}: {e}")
     
     # Salvataggio finale
-    save_results(working_set, OUTPUT_FILE)
+    save_results(working_sorted, OUTPUT_FILE)
     
     # Riepilogo
     print(f"\n{'='*60}")
@@ -10,7 +10,7 @@ Error Page Cleaner + Text Sanitizer v3
 - Overwrites original file safely after cleaning
 """
 
-import json
+import orjson
 import re
 import os
 import shutil
@@ -27,40 +27,43 @@ TEMP_OUTPUT = INPUT_FILE.replace(".json", "--error-clean.json")
 # TEXT CLEANING / UNICODE SANITIZATION
 # ==============================================================
 
+UNICODE_REPLACEMENTS = {
+    "\u2013": "-",   # en dash
+    "\u2014": "-",   # em dash
+    "\u2018": "'",   # single quote open
+    "\u2019": "'",   # single quote close
+    "\u201C": '"',   # double quote open
+    "\u201D": '"',   # double quote close
+    "\u2026": "...", # ellipsis
+    "\u2212": "-",   # minus sign
+    "\u00A0": " ",   # non-breaking space
+    "\u202F": " ",   # narrow no-break space
+}
+SANITIZE_TABLE = str.maketrans(UNICODE_REPLACEMENTS)
+# Stessa tabella + separatori invisibili: clean_text fa un solo passaggio translate()
+CLEAN_TABLE = str.maketrans({
+    **UNICODE_REPLACEMENTS,
+    "\u2028": " ",   # line separator
+    "\u2029": " ",   # paragraph separator
+    "\ufeff": "",    # BOM
+    "\u200b": "",    # zero-width space
+})
+WS_RE = re.compile(r'\s+')
+
+
 def sanitize_unicode(s: str) -> str:
     """Sostituisce caratteri Unicode ambigui o tipografici con equivalenti ASCII"""
     if not isinstance(s, str):
         return s
-    replacements = {
-        "\u2013": "-",   # en dash
-        "\u2014": "-",   # em dash
-        "\u2018": "'",   # single quote open
-        "\u2019": "'",   # single quote close
-        "\u201C": '"',   # double quote open
-        "\u201D": '"',   # double quote close
-        "\u2026": "...", # ellipsis
-        "\u2212": "-",   # minus sign
-        "\u00A0": " ",   # non-breaking space
-        "\u202F": " ",   # narrow no-break space
-    }
-    for bad, good in replacements.items():
-        s = s.replace(bad, good)
-    return s
+    return s.translate(SANITIZE_TABLE)
 
 
 def clean_text(value: str) -> str:
     """Rimuove caratteri invisibili, LS/PS, BOM, zero-width e normalizza spazi"""
     if not value:
         return ""
-    value = sanitize_unicode(value)
-    cleaned = (
-        value.replace("\u2028", " ")
-             .replace("\u2029", " ")
-             .replace("\ufeff", "")
-             .replace("\u200b", "")
-             .strip()
-    )
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    cleaned = value.translate(CLEAN_TABLE).strip()
+    cleaned = WS_RE.sub(' ', cleaned)
     return cleaned
 
 
@@ -68,21 +71,28 @@ def clean_text(value: str) -> str:
 # ERROR / 404 FILTER
 # ==============================================================
 
+ERROR_PATTERNS = [
+    "error",
+    "404",
+    "not found",
+    "page not found",
+    "server error",
+    "an error has occurred",
+    "forbidden",
+    "unavailable",
+    "internal error",
+]
+# Un'unica alternanza compilata: una sola scansione invece di una ricerca per pattern
+ERROR_RE = re.compile("|".join(map(re.escape, ERROR_PATTERNS)))
+
+
 def contains_error_content(*parts) -> bool:
     """Rileva pagine con contenuto 'error', '404', 'not found', ecc."""
-    joined = " ".join(p.lower() for p in parts if p)
-    patterns = [
-        "error",
-        "404",
-        "not found",
-        "page not found",
-        "server error",
-        "an error has occurred",
-        "forbidden",
-        "unavailable",
-        "internal error",
-    ]
-    return any(p in joined for p in patterns)
+    # Campo per campo, senza unirli: ci si ferma al primo che contiene un errore
+    for p in parts:
+        if p and ERROR_RE.search(p.lower()):
+            return True
+    return False
 
 
 # ==============================================================
@@ -100,8 +110,8 @@ def main():
 
     # --- Read JSON ---
     print(f"📂 Lettura file: {INPUT_FILE}")
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(INPUT_FILE, "rb") as f:
+        data = orjson.loads(f.read())
 
     if not isinstance(data, list):
         print("⚠️  Il file non contiene una lista JSON valida.")
@@ -111,6 +121,7 @@ def main():
 
     cleaned_data = []
     removed = 0
+    removed_log = []  # righe "Rimossa" stampate in blocco a fine ciclo, non una print per voce
 
     for item in data:
         url = item.get("url", "")
@@ -121,7 +132,7 @@ def main():
         # Filtra se contiene errori
         if contains_error_content(title, desc, body):
             removed += 1
-            print(f"  ⚠️  Rimossa: {url} (pagina di errore)")
+            removed_log.append(f"  ⚠️  Rimossa: {url} (pagina di errore)")
             continue
 
         # Normalizza campi vuoti
@@ -132,7 +143,7 @@ def main():
         # Nuova regola: rimuovi se title è "void" e preview < 50 caratteri
         if title == "void" and len(body) < 50:
             removed += 1
-            print(f"  ⚠️  Rimossa: {url} (title void + preview troppo corto)")
+            removed_log.append(f"  ⚠️  Rimossa: {url} (title void + preview troppo corto)")
             continue
 
         cleaned_data.append({
@@ -142,16 +153,15 @@ def main():
             "preview": body
         })
 
-    # Pulizia finale del JSON
-    json_text = json.dumps(cleaned_data, indent=2, ensure_ascii=False)
-    json_text = clean_text(json_text)
+    if removed_log:
+        print("\n".join(removed_log))
 
-    # --- Scrive prima file temporaneo ---
-    with open(TEMP_OUTPUT, "w", encoding="utf-8") as f:
-        f.write(json_text)
+    # --- Scrive prima file temporaneo (i campi sono già passati da clean_text) ---
+    with open(TEMP_OUTPUT, "wb") as f:
+        f.write(orjson.dumps(cleaned_data, option=orjson.OPT_INDENT_2))
 
-    # --- Sovrascrive l’input con il file pulito ---
-    shutil.move(TEMP_OUTPUT, INPUT_FILE)
+    # --- Sovrascrive l’input con il file pulito (stessa cartella: rename atomico) ---
+    os.replace(TEMP_OUTPUT, INPUT_FILE)
 
     # --- Report finale ---
     print(f"\n✅ Pulizia completata!")
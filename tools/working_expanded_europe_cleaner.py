@@ -2,7 +2,7 @@ import json
 import os
 import re
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from langdetect import detect, DetectorFactory, LangDetectException
 
 DetectorFactory.seed = 0
@@ -10,6 +10,9 @@ DetectorFactory.seed = 0
 INPUT_FILE = "./json_lists/working_expanded.json"
 OUTPUT_FILE = "./json_lists/working_expanded_eu.json"
 TIMEOUT = 5  # seconds per site
+# Caratteri invisibili → spazio, in un solo passaggio translate()
+INVISIBLE_TABLE = str.maketrans({c: " " for c in "\u2028\u2029\u200b\ufeff"})
+WS_RE = re.compile(r"\s+")
 
 # Lingue europee considerate valide
 EURO_LANGS = {
@@ -26,8 +29,7 @@ def clean_text(text):
     """Rimuove caratteri invisibili e normalizza spazi"""
     if not text:
         return ""
-    text = re.sub(r"[\u2028\u2029\u200b\ufeff]", " ", text)
-    return re.sub(r"\s+", " ", text).strip()
+    return WS_RE.sub(" ", text.translate(INVISIBLE_TABLE)).strip()
 
 
 def detect_language(text):
@@ -47,10 +49,12 @@ def fetch_html_text(url):
         resp = requests.get(url, timeout=TIMEOUT, headers=headers, allow_redirects=True)
         if resp.status_code >= 400:
             return ""
-        soup = BeautifulSoup(resp.content, "html.parser")
-        for tag in soup(["script", "style", "nav", "header", "footer", "aside"]):
-            tag.decompose()
-        text = soup.get_text(separator=" ", strip=True)
+        # selectolax (parser C) al posto di BeautifulSoup
+        tree = LexborHTMLParser(resp.content)
+        tree.strip_tags(["script", "style", "nav", "header", "footer", "aside"])
+        if tree.root is None:
+            return ""
+        text = tree.root.text(separator=" ", strip=True)
         text = clean_text(text)
         return text[:2000]  # massimo 2000 caratteri per evitare testi enormi
     except Exception:
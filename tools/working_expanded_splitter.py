@@ -4,11 +4,12 @@ Crea 1000 file JSON con numero casuale di siti (10–200), scelti casualmente da
 privilegiando quelli meno usati per massimizzare la varietà.
 """
 
-import json
+import orjson
 import os
 import random
 import math
-from collections import defaultdict
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------- CONFIG ----------
 INPUT_FILE = "./json_lists/working_expanded_eu.json"
@@ -19,6 +20,7 @@ MIN_ITEMS = 10
 MAX_ITEMS = 200
 MEAN_ITEMS = 100
 STD_DEV = 30
+WRITE_WORKERS = 4  # thread che scrivono i file mentre si estraggono i successivi
 # ----------------------------
 
 
@@ -32,13 +34,23 @@ def random_items_count():
     return max(MIN_ITEMS, min(MAX_ITEMS, n))
 
 
+def serialize_items(data):
+    """Serializza ogni voce una sola volta, già indentata come dentro "data": [...]"""
+    return [
+        b"    " + orjson.dumps(item, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n    ")
+        for item in data
+    ]
+
+
 def write_chunk(items, out_path):
-    output_data = {
-        "data": items,
-        "_meta": {"total_bookmarks": len(items)}
-    }
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    # Stessi byte di orjson.dumps({"data": ..., "_meta": ...}, OPT_INDENT_2),
+    # ma le voci sono già serializzate: qui si concatena e basta
+    meta = b'\n  ],\n  "_meta": {\n    "total_bookmarks": %d\n  }\n}' % len(items)
+    # Un solo blob → una sola write; il .tmp rinominato evita file a metà se il run si interrompe
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b'{\n  "data": [\n' + b",\n".join(items) + meta)
+    os.replace(tmp_path, out_path)
 
 
 def main():
@@ -46,34 +58,47 @@ def main():
         print(f"❌ File di input non trovato: {INPUT_FILE}")
         return
 
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(INPUT_FILE, "rb") as f:
+        # Dopo la serializzazione restano in memoria solo i bytes delle voci, non i dict
+        data = serialize_items(orjson.loads(f.read()))
 
     total = len(data)
     print(f"📦 Voci disponibili: {total}")
 
     ensure_output_dir(OUTPUT_DIR)
 
-    used_count = defaultdict(int)
-
-    for i in range(1, NUM_FILES + 1):
-        k = random_items_count()
-
-        # Calcola pesi inversi alla frequenza (meno usati = più probabili)
-        weights = [1 / (1 + used_count[id(item)]) for item in data]
-        selected = random.choices(data, weights=weights, k=k)
-
-        # Aggiorna contatori d’uso
-        for item in selected:
-            used_count[id(item)] += 1
-
-        filename = f"{BASE_NAME}_{i:04d}.json"
-        out_path = os.path.join(OUTPUT_DIR, filename)
-        write_chunk(selected, out_path)
-
-        if i % 50 == 0 or i == NUM_FILES:
-            avg_uses = sum(used_count.values()) / len(used_count)
-            print(f"   ✅ {i}/{NUM_FILES} file creati (ultimo: {k} voci) — media usi: {avg_uses:.2f}")
+    # Usi e pesi per posizione: a ogni giro si aggiornano solo le voci estratte
+    # Array densi (interi / double C) invece di liste di oggetti Python
+    used_count = array("I", [0]) * total
+    weights = array("d", [1.0]) * total  # pesi inversi alla frequenza (meno usati = più probabili)
+    positions = range(total)
+
+    # L'estrazione resta nel thread principale (stessa sequenza random),
+    # le scritture vanno al pool e si sovrappongono alle estrazioni successive
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        pending = []
+        for i in range(1, NUM_FILES + 1):
+            k = random_items_count()
+
+            picked = random.choices(positions, weights=weights, k=k)
+            selected = [data[j] for j in picked]
+
+            # Aggiorna contatori d’uso e pesi delle sole voci scelte
+            for j in picked:
+                used_count[j] += 1
+                weights[j] = 1 / (1 + used_count[j])
+
+            filename = f"{BASE_NAME}_{i:04d}.json"
+            out_path = os.path.join(OUTPUT_DIR, filename)
+            pending.append(executor.submit(write_chunk, selected, out_path))
+
+            if i % 50 == 0 or i == NUM_FILES:
+                # Barriera: i file contati qui sono davvero su disco (ed eventuali errori emergono)
+                for future in pending:
+                    future.result()
+                pending.clear()
+                avg_uses = sum(used_count) / total
+                print(f"   ✅ {i}/{NUM_FILES} file creati (ultimo: {k} voci) — media usi: {avg_uses:.2f}")
 
     print(f"\n✅ Completato. {NUM_FILES} file generati con distribuzione random bilanciata.")
     print(f"   Output: {os.path.abspath(OUTPUT_DIR)}")